@@ -1,17 +1,27 @@
 from __future__ import annotations
 
+import asyncio
+from datetime import datetime, timezone
 import json
 from pathlib import Path
+import shutil
 import uuid
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from ..config import settings
-from ..database import get_db
-from ..models import Job
-from ..schemas import ConfirmPayload, UploadResponse, from_job_record
+from ..database import get_async_db
+from ..models import Job, PORecord
+from ..schemas import ConfirmPayload, ReprocessPayload, UploadResponse, from_job_record
+from ..services.admission import admission_controller
+from ..services.checkpoints import clear_checkpoints
 from ..services.job_runner import event_bus, job_runner
 from ..services.logger import append_job_log
+from ..services.scheduler import ACTIVE_STATUSES, DEFAULT_PRIORITY, PRIORITIES
+from ..services.tracing import profile_path, resolve_trace_mode, trace_path
 
 router = APIRouter()
 
@@ -20,16 +30,60 @@ def _safe_filename(name: str) -> str:
     return Path(name).name.replace(" ", "_")
 
 
+def _file_url(file_path: str | Path) -> str:
+    return f"/uploads/{Path(file_path).relative_to(settings.uploads_dir).as_posix()}"
+
+
+async def _find_idempotent_job(db: AsyncSession, user_id: str, idempotency_key: str) -> Job | None:
+    stmt = select(Job).where(Job.user_id == user_id, Job.idempotency_key == idempotency_key)
+    return await db.scalar(stmt)
+
+
+async def _get_job_or_404(db: AsyncSession, job_id: str, *options) -> Job:
+    job = await db.get(Job, job_id, options=options)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+
+def _replayed_upload(job: Job) -> UploadResponse:
+    return UploadResponse(
+        job_id=job.id,
+        status=job.status,
+        file_url=_file_url(job.file_path),
+        trace_mode=job.trace_mode,
+        ocr_mode=job.ocr_mode,
+    )
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_po(
     user_id: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    priority: str = Form(DEFAULT_PRIORITY),
+    x_trace: str | None = Header(default=None),
+    idempotency_key: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+
+    # A retried upload with the same key returns the original job instead of queueing a duplicate.
+    if idempotency_key and (existing := await _find_idempotent_job(db, user_id, idempotency_key)):
+        return _replayed_upload(existing)
+
     ext = Path(file.filename).suffix.lower()
     if ext not in settings.allowed_extensions:
         raise HTTPException(status_code=400, detail="Unsupported file extension")
 
+    admission = await admission_controller.decide(db, settings.ocr_mode, user_id, priority)
+    if not admission.admitted:
+        raise HTTPException(
+            status_code=429,
+            detail=f"OCR backlog too long (estimated wait {admission.estimated_wait_sec:.0f}s), retry later",
+            headers={"Retry-After": str(admission.retry_after_sec)},
+        )
+
     content = await file.read()
     if len(content) > settings.max_upload_mb * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large")
@@ -38,11 +92,10 @@ async def upload_po(
 
     job_id = str(uuid.uuid4())
     folder = settings.uploads_dir / job_id
-    folder.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(folder.mkdir, parents=True, exist_ok=True)
 
     file_path = folder / _safe_filename(file.filename)
-    with file_path.open("wb") as f:
-        f.write(content)
+    await asyncio.to_thread(file_path.write_bytes, content)
 
     job = Job(
         id=job_id,
@@ -50,44 +103,123 @@ async def upload_po(
         status="queued",
         file_path=str(file_path),
         original_filename=file.filename,
+        trace_mode=resolve_trace_mode(x_trace),
+        priority=priority,
+        ocr_mode=admission.ocr_mode,
+        idempotency_key=idempotency_key,
     )
     db.add(job)
-    db.commit()
-
-    append_job_log(db, job_id, "queued", "job created and queued")
-    await job_runner.enqueue(job_id)
-    relative_path = file_path.relative_to(settings.uploads_dir)
-    return UploadResponse(job_id=job_id, status="queued", file_url=f"/uploads/{relative_path.as_posix()}")
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent request carrying the same key.
+        await db.rollback()
+        await asyncio.to_thread(shutil.rmtree, folder, ignore_errors=True)
+        existing = await _find_idempotent_job(db, user_id, idempotency_key)
+        if existing is None:
+            raise
+        return _replayed_upload(existing)
+
+    await append_job_log(db, job_id, "queued", "job created and queued")
+    if admission.note:
+        await append_job_log(db, job_id, "queued", admission.note)
+    await job_runner.enqueue(job)
+    return UploadResponse(
+        job_id=job_id,
+        status="queued",
+        file_url=_file_url(file_path),
+        trace_mode=job.trace_mode,
+        ocr_mode=job.ocr_mode,
+        estimated_wait_sec=round(admission.estimated_wait_sec, 1),
+        estimated_completion_at=admission.estimated_completion_at.isoformat(),
+    )
 
 
 @router.get("/job/{job_id}")
-def get_job(job_id: str, db: Session = Depends(get_db)):
-    job = db.get(Job, job_id)
-    if not job:
-        raise HTTPException(status_code=404, detail="job not found")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await _get_job_or_404(db, job_id, selectinload(Job.logs))
     return from_job_record(job)
 
 
 @router.get("/job/{job_id}/logs")
-def get_job_logs(job_id: str, db: Session = Depends(get_db)):
-    job = db.get(Job, job_id)
-    if not job:
-        raise HTTPException(status_code=404, detail="job not found")
+async def get_job_logs(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    await _get_job_or_404(db, job_id)
 
     log_path = settings.job_logs_dir / f"{job_id}.log"
     if not log_path.exists():
         return {"job_id": job_id, "logs": []}
-    lines = log_path.read_text(encoding="utf-8").splitlines()
-    return {"job_id": job_id, "logs": lines}
+    text = await asyncio.to_thread(log_path.read_text, encoding="utf-8")
+    return {"job_id": job_id, "logs": text.splitlines()}
+
+
+@router.post("/job/{job_id}/reprocess")
+async def reprocess_job(job_id: str, payload: ReprocessPayload, db: AsyncSession = Depends(get_async_db)):
+    job = await _get_job_or_404(db, job_id)
+    if job.status in ("queued", *ACTIVE_STATUSES):
+        raise HTTPException(status_code=409, detail="job is already queued or running")
+
+    if payload.from_stage != "auto":
+        await clear_checkpoints(db, job_id, payload.from_stage)
+    job.status = "queued"
+    job.queued_at = datetime.utcnow()  # ages from now, not from the original upload
+    job.error_message = None
+    db.add(job)
+    await db.commit()
+
+    await append_job_log(db, job_id, "queued", f"reprocess requested from_stage={payload.from_stage}")
+    await job_runner.enqueue(job)
+    return {"job_id": job_id, "status": "queued", "from_stage": payload.from_stage}
+
+
+@router.get("/job/{job_id}/trace")
+async def get_job_trace(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await _get_job_or_404(db, job_id)
+
+    path = trace_path(job_id)
+    if not job.trace_mode or not path.exists():
+        raise HTTPException(status_code=404, detail="trace not available")
+    return FileResponse(path, media_type="application/json", filename=f"{job_id}.trace.json")
+
+
+@router.get("/job/{job_id}/profile")
+async def get_job_profile(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    job = await _get_job_or_404(db, job_id)
+
+    path = profile_path(job_id, job.trace_mode) if job.trace_mode else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="profile not available")
+    media_type = "text/html" if path.suffix == ".html" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=path.name)
 
 
 @router.get("/job/{job_id}/stream")
 async def job_stream(job_id: str):
     async def event_gen():
         q = event_bus.subscribe(job_id)
+        last_position = None
+        track_position = True
         try:
             while True:
-                payload = await q.get()
+                # Report queue position on connect and whenever it changes while queued.
+                # Shielded: a client disconnect cancels this generator, and cancelling a
+                # query midway would hand a broken connection back to the pool.
+                position = await asyncio.shield(job_runner.queue_position(job_id)) if track_position else None
+                if position is None:
+                    track_position = False
+                elif position != last_position:
+                    last_position = position
+                    payload = {
+                        "status": "queued",
+                        "message": f"queue position {position}",
+                        "progress_percent": 5,
+                        "queue_position": position,
+                        "ts": datetime.now(timezone.utc).isoformat(),
+                    }
+                    yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                try:
+                    payload = await asyncio.wait_for(q.get(), timeout=settings.queue_position_interval_sec)
+                except asyncio.TimeoutError:
+                    continue
                 yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
         finally:
             event_bus.unsubscribe(job_id, q)
@@ -96,18 +228,14 @@ async def job_stream(job_id: str):
 
 
 @router.post("/job/{job_id}/confirm")
-async def confirm_job(job_id: str, payload: ConfirmPayload, db: Session = Depends(get_db)):
-    from ..services.job_runner import job_runner
-    from ..models import PORecord
-
-    job = db.get(Job, job_id)
-    if not job:
-        raise HTTPException(status_code=404, detail="job not found")
+async def confirm_job(job_id: str, payload: ConfirmPayload, db: AsyncSession = Depends(get_async_db)):
+    job = await _get_job_or_404(db, job_id)
     if not job.extracted_fields:
         raise HTTPException(status_code=400, detail="job not ready")
 
     data = payload.extracted_fields.model_dump() if payload.extracted_fields else job.extracted_fields
     await job_runner._save_record(db, job, data)
 
-    append_job_log(db, job_id, "saving", "user confirmed and data saved")
-    return {"job_id": job_id, "status": "saved", "saved": db.query(PORecord).filter(PORecord.job_id == job_id).count() == 1}
+    await append_job_log(db, job_id, "saving", "user confirmed and data saved")
+    saved = await db.scalar(select(func.count()).select_from(PORecord).where(PORecord.job_id == job_id))
+    return {"job_id": job_id, "status": "saved", "saved": saved == 1}
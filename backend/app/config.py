@@ -9,17 +9,45 @@ class Settings(BaseSettings):
     storage_dir: Path = Path("storage")
     uploads_dir: Path = Path("storage/uploads")
     job_logs_dir: Path = Path("storage/job_logs")
+    job_traces_dir: Path = Path("storage/job_traces")
     sqlite_path: Path = Path("storage/app.db")
+    database_url: str | None = None  # e.g. postgresql://user:pw@host/db; unset = SQLite at sqlite_path
     max_upload_mb: int = 8
     allowed_extensions: tuple[str, ...] = (".jpg", ".jpeg", ".png")
     worker_count: int = 1
+    worker_processes: int = 1  # backend.app.worker processes when ENABLE_IN_PROCESS_WORKER=false (admission capacity)
     enable_in_process_worker: bool = True
     worker_poll_interval_sec: float = 1.0
     auto_save: bool = False
-    ocr_mode: str = "fast"  # fast | typhoon
+    ocr_mode: str = "fast"  # fast | typhoon | stub
     typhoon_model_source: str = "local"  # local | huggingface
     typhoon_model_ref: str = "models/typhoon-ocr1.5-2b"
     hf_token: str | None = None
+    trace_sample_rate: float = 0.0
+    scheduler_user_weights: dict[str, float] = {}
+    scheduler_max_running_per_user: int = 0  # 0 = unlimited
+    scheduler_starvation_age_sec: float = 300.0
+    scheduler_usage_half_life_sec: float = 600.0  # fair-share memory of past starts; 0 = never forget
+    queue_position_interval_sec: float = 2.0
+    admission_slo_sec: float = 0.0  # 0 = admit everything
+    admission_overload_action: str = "reject"  # reject | downgrade
+    admission_sample_size: int = 50
+    admission_cache_ttl_sec: float = 5.0
+    stream_flush_interval_sec: float = 0.3
+    job_stale_after_sec: float = 900.0
+    model_server_address: str | None = None  # host:port or unix socket path; unset = load model in-process
+    model_server_authkey: str | None = None  # required with MODEL_SERVER_ADDRESS; a secret, never committed
+    model_server_replicas: int = 2
+    model_server_replica_mode: str = "thread"  # thread | fork
+    model_server_threads_per_replica: int = 0  # 0 = cpu_count // replicas
+    model_server_max_queue: int = 64
+    model_server_timeout_sec: float = 600.0
+    model_server_health_interval_sec: float = 5.0
+
+    def ensure_storage_dirs(self) -> None:
+        """Create storage directories; called at process startup, never at import."""
+        for path in (self.storage_dir, self.uploads_dir, self.job_logs_dir):
+            path.mkdir(parents=True, exist_ok=True)
 
 
 settings = Settings()
@@ -1,18 +1,123 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Connection, Engine, create_engine, event, inspect, make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from .config import settings
 
-settings.storage_dir.mkdir(parents=True, exist_ok=True)
+# Async drivers used by the app for each sync URL scheme.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
 
-database_url = f"sqlite:///{settings.sqlite_path}"
-engine = create_engine(database_url, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+database_url = make_url(settings.database_url or f"sqlite:///{settings.sqlite_path}")
+backend_name = database_url.get_backend_name()
+async_database_url = (
+    database_url.set(drivername=f"{backend_name}+{ASYNC_DRIVERS[backend_name]}")
+    if backend_name in ASYNC_DRIVERS
+    else database_url
+)
+is_sqlite = backend_name == "sqlite"
+
+engine_args = {}
+if not (is_sqlite and database_url.database in (None, "", ":memory:")):
+    # One connection per worker plus SQLAlchemy's default 5 (+10 overflow) for uploads and SSE.
+    engine_args["pool_size"] = max(1, settings.worker_count) + 5
+
+# Async engine: routes and job workers, so DB I/O never blocks the event loop.
+async_engine = create_async_engine(async_database_url, **engine_args)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
+def _sqlite_pragmas(dbapi_conn, _):
+    # Wait on a concurrent writer instead of failing with "database is locked".
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+if is_sqlite:
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+_sync: dict[str, object] = {}
+
+
+def _sync_engine() -> Engine:
+    """Sync engine for scripts, built on first use so the app never imports a sync driver."""
+    if "engine" not in _sync:
+        engine = create_engine(database_url, connect_args={"check_same_thread": False} if is_sqlite else {})
+        if is_sqlite:
+            event.listen(engine, "connect", _sqlite_pragmas)
+        _sync["engine"] = engine
+        _sync["sessionmaker"] = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    return _sync["engine"]
+
+
+def _sync_sessionmaker() -> sessionmaker:
+    _sync_engine()
+    return _sync["sessionmaker"]
+
+
+def __getattr__(name: str):
+    # ``engine`` / ``SessionLocal`` stay importable for scripts without creating them at import time.
+    if name == "engine":
+        return _sync_engine()
+    if name == "SessionLocal":
+        return _sync_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _migrate(conn: Connection):
+    """Create tables, then add columns and indexes introduced after a database was first created."""
+    from . import models  # noqa: F401 - register tables on Base.metadata
+
+    Base.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT {default.text if hasattr(default, 'text') else repr(str(default))}"
+            conn.execute(text(ddl))
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _enable_wal(engine: Engine):
+    # Readers (SSE, job polling) don't wait behind the workers' writes. Must run outside a transaction.
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+
+
+def init_db():
+    """Schema setup for scripts (sync driver); the app uses ``init_db_async``."""
+    settings.ensure_storage_dirs()
+    engine = _sync_engine()
+    if is_sqlite:
+        _enable_wal(engine)
+    with engine.begin() as conn:
+        _migrate(conn)
+
+
+async def init_db_async():
+    """Schema setup over the async engine, so the app only needs the async driver."""
+    settings.ensure_storage_dirs()
+    if is_sqlite:
+        async with async_engine.connect() as conn:
+            await conn.run_sync(lambda sync_conn: sync_conn.exec_driver_sql("PRAGMA journal_mode=WAL"))
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_migrate)
+
+
 def get_db():
-    db = SessionLocal()
+    db = _sync_sessionmaker()()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
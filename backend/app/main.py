@@ -4,8 +4,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from .api.routes import router
 from .config import settings
-from .database import Base, engine
+from .database import init_db_async
 from .services.job_runner import job_runner
+from .services.logger import configure_system_logger
 
 
 app = FastAPI(title=settings.app_name)
@@ -18,8 +19,8 @@ app.add_middleware(
 )
 app.include_router(router)
 
-settings.uploads_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(settings.uploads_dir)), name="uploads")
+# The directory is created at startup; skip the import-time existence check.
+app.mount("/uploads", StaticFiles(directory=str(settings.uploads_dir), check_dir=False), name="uploads")
 
 frontend_dir = Path("frontend")
 if frontend_dir.exists():
@@ -28,8 +29,7 @@ if frontend_dir.exists():
 
 @app.on_event("startup")
 async def startup_event():
-    settings.uploads_dir.mkdir(parents=True, exist_ok=True)
-    settings.job_logs_dir.mkdir(parents=True, exist_ok=True)
-    Base.metadata.create_all(bind=engine)
+    await init_db_async()
+    configure_system_logger()
     if settings.enable_in_process_worker:
         await job_runner.start_queue_workers()
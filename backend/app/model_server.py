@@ -0,0 +1,31 @@
+import argparse
+import json
+
+from .config import settings
+from .services.model_server import ModelServer, ModelServerClient
+
+
+def _require_address() -> str:
+    if not settings.model_server_address:
+        raise SystemExit("Set MODEL_SERVER_ADDRESS (host:port or unix socket path) to run the model server")
+    return settings.model_server_address
+
+
+def run_model_server() -> None:
+    ModelServer(
+        _require_address(),
+        replicas=settings.model_server_replicas,
+        replica_mode=settings.model_server_replica_mode,
+        threads_per_replica=settings.model_server_threads_per_replica,
+        max_queue=settings.model_server_max_queue,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared Typhoon OCR model server")
+    parser.add_argument("--check", action="store_true", help="query a running server's health and exit")
+    args = parser.parse_args()
+    if args.check:
+        print(json.dumps(ModelServerClient(_require_address()).health()))
+    else:
+        run_model_server()
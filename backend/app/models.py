@@ -1,11 +1,12 @@
 from datetime import datetime
-from sqlalchemy import DateTime, Float, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, JSON, String, Text, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .database import Base
 
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_user_idempotency_key", "user_id", "idempotency_key", unique=True),)
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     user_id: Mapped[str] = mapped_column(String, nullable=False)
@@ -17,6 +18,14 @@ class Job(Base):
     field_confidence: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     warnings: Mapped[list | None] = mapped_column(JSON, nullable=True)
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    trace_mode: Mapped[str | None] = mapped_column(String, nullable=True)
+    priority: Mapped[str] = mapped_column(String, default="interactive", server_default="interactive", nullable=False)
+    ocr_mode: Mapped[str | None] = mapped_column(String, nullable=True)
+    service_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    idempotency_key: Mapped[str | None] = mapped_column(String, nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    # Last time the job entered the queue (upload, reprocess, stale requeue); drives aging and FIFO.
+    queued_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, default=datetime.utcnow)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -26,6 +35,11 @@ class Job(Base):
         cascade="all, delete-orphan",
         order_by="JobLog.id",
     )
+    checkpoints: Mapped[list["JobCheckpoint"]] = relationship(
+        "JobCheckpoint",
+        back_populates="job",
+        cascade="all, delete-orphan",
+    )
 
 
 class JobLog(Base):
@@ -40,6 +54,21 @@ class JobLog(Base):
     job: Mapped[Job] = relationship("Job", back_populates="logs")
 
 
+class JobCheckpoint(Base):
+    __tablename__ = "job_checkpoints"
+    __table_args__ = (UniqueConstraint("job_id", "stage", name="uq_job_checkpoints_job_stage"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[str] = mapped_column(ForeignKey("jobs.id"), nullable=False)
+    stage: Mapped[str] = mapped_column(String, nullable=False)
+    version: Mapped[str] = mapped_column(String, nullable=False)
+    input_digest: Mapped[str | None] = mapped_column(String, nullable=True)
+    data: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    job: Mapped[Job] = relationship("Job", back_populates="checkpoints")
+
+
 class PORecord(Base):
     __tablename__ = "po_records"
 
@@ -59,3 +88,24 @@ class PORecord(Base):
     currency: Mapped[str] = mapped_column(String, default="THB")
     payment_terms: Mapped[str | None] = mapped_column(String, nullable=True)
     data: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+
+def po_record_values(job_id: str, data: dict) -> dict:
+    """``PORecord`` column values for validated extracted fields."""
+    return {
+        "job_id": job_id,
+        "po_number": data.get("po_number"),
+        "po_date": data.get("po_date"),
+        "buyer_company_name": data.get("buyer_company_name"),
+        "buyer_tax_id": data.get("buyer_tax_id"),
+        "seller_company_name": data.get("seller_company_name"),
+        "seller_tax_id": data.get("seller_tax_id"),
+        "delivery_address": data.get("delivery_address"),
+        "sub_total": data.get("sub_total"),
+        "vat_rate": data.get("vat_rate"),
+        "vat_amount": data.get("vat_amount"),
+        "grand_total": data.get("grand_total"),
+        "currency": data.get("currency") or "THB",
+        "payment_terms": data.get("payment_terms"),
+        "data": data,
+    }
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import date
-from typing import Any
+from typing import Any, Literal
 from pydantic import BaseModel, Field, field_validator, model_validator
 
 
@@ -58,6 +58,7 @@ class JobResponse(BaseModel):
     status: str
     progress_percent: int
     user_id: str
+    priority: str = "interactive"
     original_filename: str
     created_at: str
     updated_at: str
@@ -71,6 +72,11 @@ class ConfirmPayload(BaseModel):
     auto_save: bool = False
 
 
+class ReprocessPayload(BaseModel):
+    # auto: resume from checkpoints still valid for the current engine/parser versions
+    from_stage: Literal["auto", "ocr", "parse"] = "auto"
+
+
 class LogLine(BaseModel):
     ts: str
     step: str
@@ -81,6 +87,10 @@ class UploadResponse(BaseModel):
     job_id: str
     status: str
     file_url: str
+    trace_mode: str | None = None
+    ocr_mode: str | None = None
+    estimated_wait_sec: float | None = None
+    estimated_completion_at: str | None = None
 
 
 def from_job_record(job: Any) -> JobResponse:
@@ -107,6 +117,7 @@ def from_job_record(job: Any) -> JobResponse:
         status=job.status,
         progress_percent=progress_by_status.get(job.status, 0),
         user_id=job.user_id,
+        priority=job.priority,
         original_filename=job.original_filename,
         created_at=job.created_at.isoformat(),
         updated_at=job.updated_at.isoformat(),
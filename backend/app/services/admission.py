@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import math
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models import Job
+from .job_runner import QUEUED_AT, job_runner
+from .scheduler import ACTIVE_STATUSES, QueuedJob
+
+# Used until an engine has finished jobs to measure.
+DEFAULT_SERVICE_SEC = {"stub": 0.1, "fast": 3.0, "typhoon": 45.0}
+
+
+@dataclass
+class AdmissionDecision:
+    admitted: bool
+    ocr_mode: str
+    estimated_wait_sec: float
+    estimated_service_sec: float
+    retry_after_sec: int | None = None
+    note: str | None = None
+
+    @property
+    def estimated_completion_at(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.estimated_wait_sec + self.estimated_service_sec)
+
+
+class AdmissionController:
+    """Estimate queue wait from the work ahead of a new job and measured per-engine service time.
+
+    Both inputs come from the jobs table, so the web process sees the work of
+    separate worker processes too. Service times are cached briefly to keep
+    uploads cheap.
+    """
+
+    def __init__(self):
+        self._service_cache: dict[str, tuple[float, float]] = {}
+
+    @staticmethod
+    def capacity(mode: str) -> int:
+        """How many jobs of an engine can make progress at once across all OCR processes."""
+        processes = 1 if settings.enable_in_process_worker else max(1, settings.worker_processes)
+        if mode == "typhoon":
+            if settings.model_server_address:
+                return max(1, settings.model_server_replicas)
+            return processes  # OCRService._typhoon_lock: one generate per process
+        return processes * max(1, settings.worker_count)
+
+    async def service_time_sec(self, db: AsyncSession, mode: str) -> float:
+        cached = self._service_cache.get(mode)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        recent = (
+            select(Job.service_ms)
+            .where(Job.status == "done", Job.ocr_mode == mode, Job.service_ms.is_not(None))
+            .order_by(Job.updated_at.desc())
+            .limit(settings.admission_sample_size)
+            .subquery()
+        )
+        avg_ms = await db.scalar(select(func.avg(recent.c.service_ms)))
+        value = avg_ms / 1000 if avg_ms is not None else DEFAULT_SERVICE_SEC.get(mode, DEFAULT_SERVICE_SEC["fast"])
+        self._service_cache[mode] = (time.monotonic() + settings.admission_cache_ttl_sec, value)
+        return value
+
+    async def estimate_wait_sec(self, db: AsyncSession, user_id: str, priority: str) -> float:
+        """Seconds until a new job from ``user_id`` would start.
+
+        Only queued jobs the scheduler would start first count (priority, aging
+        and fair share via ``FairSharePolicy.order``), so another user's bulk
+        backlog doesn't delay interactive uploads. Running jobs count their
+        remaining service time.
+        """
+        now = datetime.utcnow()
+        work_sec: dict[str, float] = defaultdict(float)
+        running = select(Job.ocr_mode, Job.started_at).where(Job.status.in_(ACTIVE_STATUSES))
+        for mode, started_at in await db.execute(running):
+            mode = mode or settings.ocr_mode
+            elapsed = (now - started_at).total_seconds() if started_at else 0.0
+            work_sec[mode] += max(await self.service_time_sec(db, mode) - elapsed, 0.0)
+
+        queued = select(Job.id, Job.user_id, Job.priority, Job.ocr_mode, QUEUED_AT.label("queued_at")).where(
+            Job.status == "queued"
+        )
+        modes: dict[str, str] = {}
+        pending: list[QueuedJob] = []
+        for row in await db.execute(queued):
+            modes[row.id] = row.ocr_mode or settings.ocr_mode
+            pending.append(
+                QueuedJob(job_id=row.id, user_id=row.user_id, priority=row.priority, enqueued_at=row.queued_at)
+            )
+        new_job = QueuedJob(job_id="", user_id=user_id, priority=priority, enqueued_at=now)
+        usage = await job_runner.usage_by_user(db, now)
+        for job in job_runner.policy.order([*pending, new_job], usage, now):
+            if job is new_job:
+                break
+            work_sec[modes[job.job_id]] += await self.service_time_sec(db, modes[job.job_id])
+
+        return sum(sec / self.capacity(mode) for mode, sec in work_sec.items())
+
+    async def decide(self, db: AsyncSession, requested_mode: str, user_id: str, priority: str) -> AdmissionDecision:
+        wait_sec = await self.estimate_wait_sec(db, user_id, priority)
+        decision = AdmissionDecision(
+            admitted=True,
+            ocr_mode=requested_mode,
+            estimated_wait_sec=wait_sec,
+            estimated_service_sec=await self.service_time_sec(db, requested_mode),
+        )
+        slo = settings.admission_slo_sec
+        if slo <= 0 or wait_sec + decision.estimated_service_sec <= slo:
+            return decision
+
+        if settings.admission_overload_action == "downgrade" and requested_mode != "fast":
+            fast_service = await self.service_time_sec(db, "fast")
+            if wait_sec + fast_service <= slo:
+                decision.ocr_mode = "fast"
+                decision.estimated_service_sec = fast_service
+                decision.note = f"backlog over SLO ({slo:.0f}s), downgraded {requested_mode} -> fast"
+                return decision
+
+        decision.admitted = False
+        decision.retry_after_sec = max(1, math.ceil(wait_sec + decision.estimated_service_sec - slo))
+        return decision
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import hashlib
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import JobCheckpoint
+
+STAGES = ("ocr", "parse")
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+async def load_checkpoint(
+    db: AsyncSession,
+    job_id: str,
+    stage: str,
+    version: str,
+    input_digest: str | None = None,
+) -> dict | None:
+    """Return a stage's stored output if it was produced by ``version`` from the same input."""
+    checkpoint = await db.scalar(
+        select(JobCheckpoint).where(JobCheckpoint.job_id == job_id, JobCheckpoint.stage == stage)
+    )
+    if checkpoint is None or checkpoint.version != version:
+        return None
+    if input_digest is not None and checkpoint.input_digest != input_digest:
+        return None
+    return checkpoint.data
+
+
+async def save_checkpoint(
+    db: AsyncSession,
+    job_id: str,
+    stage: str,
+    version: str,
+    data: dict,
+    input_digest: str | None = None,
+):
+    checkpoint = await db.scalar(
+        select(JobCheckpoint).where(JobCheckpoint.job_id == job_id, JobCheckpoint.stage == stage)
+    )
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(job_id=job_id, stage=stage)
+    checkpoint.version = version
+    checkpoint.input_digest = input_digest
+    checkpoint.data = data
+    db.add(checkpoint)
+    await db.commit()
+
+
+async def clear_checkpoints(db: AsyncSession, job_id: str, from_stage: str):
+    """Drop ``from_stage`` and every later stage so a rerun recomputes them."""
+    stages = STAGES[STAGES.index(from_stage):]
+    await db.execute(delete(JobCheckpoint).where(JobCheckpoint.job_id == job_id, JobCheckpoint.stage.in_(stages)))
+    await db.commit()
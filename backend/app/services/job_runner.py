@@ -2,18 +2,33 @@ from __future__ import annotations
 
 import asyncio
 from collections import defaultdict
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
-from ..database import SessionLocal
-from ..models import Job, PORecord
+from ..database import AsyncSessionLocal
+from ..models import Job, PORecord, po_record_values
 from ..schemas import ExtractedFields
+from .checkpoints import digest, load_checkpoint, save_checkpoint
 from .logger import append_job_log
-from .ocr import OCRService, parse_po_text
+from .parsing import PARSER_VERSION, parse_po_text
+from .scheduler import ACTIVE_STATUSES, FairQueue, QueuedJob, build_policy
+from .tracing import job_trace, run_profiled, trace_span
+
+if TYPE_CHECKING:
+    from .ocr import OCRService
+
+
+# Jobs created before ``queued_at`` existed fall back to their upload time.
+QUEUED_AT = func.coalesce(Job.queued_at, Job.created_at)
 
 
 class EventBus:
@@ -36,61 +51,264 @@ class EventBus:
 
 event_bus = EventBus()
 
+HEADER_FIELDS = (
+    "po_number",
+    "po_date",
+    "buyer_company_name",
+    "buyer_tax_id",
+    "seller_company_name",
+    "seller_tax_id",
+    "delivery_address",
+    "payment_terms",
+)
+
+
+class OCRTextStream:
+    """Buffers OCR text deltas from the OCR thread and publishes them in throttled chunks.
+
+    Header fields are parsed from completed lines on each flush so the UI can
+    show them before generation finishes.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.text = ""
+        self.fields: dict = {}
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        self._parsed_upto = 0
+
+    def feed(self, delta: str):
+        with self._lock:
+            self._pending.append(delta)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.stream_flush_interval_sec)
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            chunk = "".join(self._pending)
+            self._pending.clear()
+        if not chunk:
+            return
+        self.text += chunk
+        payload = {
+            "status": "extracting",
+            "message": "ocr text streaming",
+            "progress_percent": 55,
+            "partial_text": chunk,
+            "ocr_chars": len(self.text),
+            "ts": datetime.now(timezone.utc).isoformat(),
+        }
+
+        complete_upto = self.text.rfind("\n") + 1
+        if complete_upto > self._parsed_upto:
+            self._parsed_upto = complete_upto
+            parsed, _, _ = parse_po_text(self.text[:complete_upto])
+            fields = {k: parsed[k] for k in HEADER_FIELDS if parsed.get(k) is not None}
+            if fields != self.fields:
+                self.fields = fields
+                payload["partial_fields"] = fields
+        await event_bus.publish(self.job_id, payload)
+
 
 class JobRunner:
     def __init__(self):
-        self.queue: asyncio.Queue[str] = asyncio.Queue()
-        self.ocr = OCRService(
-            settings.ocr_mode,
+        self.policy = build_policy()
+        self.queue = FairQueue(self.policy)
+        # OCR engines are built on first use so web-only processes never import them.
+        self._ocr_by_mode: dict[str, OCRService] = {}
+        self.workers: list[asyncio.Task] = []
+        self._active_job_ids: set[str] = set()
+        # OCR gets its own threads so long inference (or a job parked on the Typhoon lock)
+        # never starves the default executor that uploads and job-log writes use.
+        self._ocr_executor: ThreadPoolExecutor | None = None
+        # Queue positions for SSE, recomputed at most once per QUEUE_POSITION_INTERVAL_SEC.
+        self._positions: dict[str, int] = {}
+        self._positions_expire_at = 0.0
+        self._positions_lock = asyncio.Lock()
+
+    @staticmethod
+    def _build_ocr(mode: str) -> OCRService:
+        from .ocr import OCRService
+
+        return OCRService(
+            mode,
             settings.typhoon_model_ref,
             settings.typhoon_model_source,
             settings.hf_token,
+            settings.model_server_address,
         )
-        self.workers: list[asyncio.Task] = []
+
+    @property
+    def ocr(self) -> OCRService:
+        return self.ocr_for(settings.ocr_mode)
+
+    def ocr_for(self, mode: str | None) -> OCRService:
+        """OCR service for a job's engine; admission control may have downgraded it."""
+        mode = mode or settings.ocr_mode
+        if mode not in self._ocr_by_mode:
+            self._ocr_by_mode[mode] = self._build_ocr(mode)
+        return self._ocr_by_mode[mode]
 
     async def start_queue_workers(self):
+        # The in-memory queue is empty after a restart; reload jobs still queued in the DB.
+        await self.requeue_stale_jobs()
+        async with AsyncSessionLocal() as db:
+            for job in await db.scalars(select(Job).where(Job.status == "queued")):
+                await self.enqueue(job)
         for _ in range(max(1, settings.worker_count)):
             self.workers.append(asyncio.create_task(self.worker_loop()))
+        self.workers.append(asyncio.create_task(self.recovery_loop()))
 
     async def start_db_polling_workers(self):
+        await self.requeue_stale_jobs()
         for _ in range(max(1, settings.worker_count)):
             self.workers.append(asyncio.create_task(self.polling_worker_loop()))
+        self.workers.append(asyncio.create_task(self.recovery_loop()))
 
-    async def enqueue(self, job_id: str):
+    async def enqueue(self, job: Job):
+        self._positions_expire_at = 0.0  # include the new job in the next position lookup
         if settings.enable_in_process_worker:
-            await self.queue.put(job_id)
+            await self.queue.put(
+                QueuedJob(
+                    job_id=job.id,
+                    user_id=job.user_id,
+                    priority=job.priority,
+                    enqueued_at=job.queued_at or job.created_at,
+                )
+            )
 
     async def worker_loop(self):
         while True:
-            job_id = await self.queue.get()
+            queued = await self.queue.get()
             try:
-                await self.process_job(job_id)
+                await self.process_job(queued.job_id)
             finally:
-                self.queue.task_done()
+                await self.queue.task_done(queued)
 
     async def polling_worker_loop(self):
         while True:
-            job_id = self._claim_next_queued_job()
+            job_id = await self._claim_next_queued_job()
             if job_id:
                 await self.process_job(job_id)
                 continue
             await asyncio.sleep(max(settings.worker_poll_interval_sec, 0.1))
 
-    def _claim_next_queued_job(self) -> str | None:
-        db = SessionLocal()
-        try:
-            stmt = select(Job).where(Job.status == "queued").order_by(Job.created_at.asc())
-            job = db.execute(stmt).scalars().first()
-            if not job:
-                return None
-            job.status = "processing"
-            db.add(job)
-            db.commit()
-            return job.id
-        finally:
-            db.close()
+    async def recovery_loop(self):
+        interval = max(settings.job_stale_after_sec / 4, 5.0)
+        while True:
+            await asyncio.sleep(interval)
+            requeued = await self.requeue_stale_jobs()
+            if not settings.enable_in_process_worker:
+                continue
+            async with AsyncSessionLocal() as db:
+                for job_id in requeued:
+                    if job := await db.get(Job, job_id):
+                        await self.enqueue(job)
 
-    async def _step(self, db: Session, job: Job, status: str, message: str, extra: dict | None = None):
+    async def requeue_stale_jobs(self) -> list[str]:
+        """Put jobs whose worker died mid-flight back in the queue.
+
+        Running jobs bump ``updated_at`` on every step and heartbeat during
+        OCR, so an active job older than ``JOB_STALE_AFTER_SEC`` has lost its
+        worker. The rerun resumes from the job's checkpoints.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.job_stale_after_sec)
+        async with AsyncSessionLocal() as db:
+            stale = await db.scalars(
+                select(Job.id).where(Job.status.in_(ACTIVE_STATUSES), Job.updated_at < cutoff)
+            )
+            requeued = []
+            for job_id in stale.all():
+                if job_id in self._active_job_ids:
+                    continue
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status.in_(ACTIVE_STATUSES), Job.updated_at < cutoff)
+                    .values(status="queued", queued_at=datetime.utcnow())
+                )
+                await db.commit()
+                if result.rowcount:
+                    await append_job_log(db, job_id, "queued", "requeued after worker loss, resuming from checkpoints")
+                    requeued.append(job_id)
+            return requeued
+
+    async def _claim_next_queued_job(self) -> str | None:
+        async with AsyncSessionLocal() as db:
+            # Only the oldest job per (user, priority) can win a pick, so load just those heads.
+            row_number = func.row_number().over(
+                partition_by=(Job.user_id, Job.priority),
+                order_by=QUEUED_AT.asc(),
+            )
+            ranked = (
+                select(Job.id, Job.user_id, Job.priority, QUEUED_AT.label("queued_at"), row_number.label("rn"))
+                .where(Job.status == "queued")
+                .subquery()
+            )
+            heads = [
+                QueuedJob(job_id=row.id, user_id=row.user_id, priority=row.priority, enqueued_at=row.queued_at)
+                for row in await db.execute(select(ranked).where(ranked.c.rn == 1))
+            ]
+            running = await self._running_by_user(db)
+            now = datetime.utcnow()
+            usage = await self.usage_by_user(db, now)
+            while heads:
+                choice = self.policy.pick(heads, running, usage, now)
+                if choice is None:
+                    return None
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == choice.job_id, Job.status == "queued")
+                    .values(status="processing", started_at=now)
+                )
+                await db.commit()
+                if result.rowcount:
+                    return choice.job_id
+                heads.remove(choice)  # another worker claimed it first
+            return None
+
+    @staticmethod
+    async def _running_by_user(db: AsyncSession) -> dict[str, int]:
+        stmt = select(Job.user_id, func.count()).where(Job.status.in_(ACTIVE_STATUSES)).group_by(Job.user_id)
+        return {user_id: count for user_id, count in await db.execute(stmt)}
+
+    async def usage_by_user(self, db: AsyncSession, now: datetime) -> dict[str, float]:
+        """Fair-share usage from job starts recorded in the DB, shared by all worker processes."""
+        stmt = select(Job.user_id, Job.started_at).where(Job.started_at.is_not(None))
+        if (horizon := self.policy.usage_horizon) is not None:
+            stmt = stmt.where(Job.started_at >= now - horizon)
+        return self.policy.usage_from_starts(await db.execute(stmt), now)
+
+    async def queue_position(self, job_id: str) -> int | None:
+        """1-based expected start position of a queued job, or None once it has started.
+
+        Positions for the whole queue are computed once per tick and shared by
+        every SSE client instead of re-simulating the queue per client.
+        """
+        async with self._positions_lock:
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time >= self._positions_expire_at:
+                self._positions = await self._queue_positions()
+                self._positions_expire_at = loop_time + settings.queue_position_interval_sec
+        return self._positions.get(job_id)
+
+    async def _queue_positions(self) -> dict[str, int]:
+        if settings.enable_in_process_worker:
+            return self.queue.positions()
+
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            stmt = select(Job.id, Job.user_id, Job.priority, QUEUED_AT.label("queued_at")).where(Job.status == "queued")
+            pending = [
+                QueuedJob(job_id=row.id, user_id=row.user_id, priority=row.priority, enqueued_at=row.queued_at)
+                for row in await db.execute(stmt)
+            ]
+            return self.policy.positions(pending, await self.usage_by_user(db, now), now)
+
+    async def _step(self, db: AsyncSession, job: Job, status: str, message: str, extra: dict | None = None):
         progress_by_status = {
             "queued": 5,
             "processing": 20,
@@ -101,9 +319,11 @@ class JobRunner:
             "failed": 100,
         }
         job.status = status
-        db.add(job)
-        db.commit()
-        append_job_log(db, job.id, status, message)
+        with trace_span("db.commit_status", status=status):
+            db.add(job)
+            await db.commit()
+        with trace_span("db.append_job_log", status=status):
+            await append_job_log(db, job.id, status, message)
         payload = {
             "status": status,
             "message": message,
@@ -115,43 +335,94 @@ class JobRunner:
         await event_bus.publish(job.id, payload)
 
     async def process_job(self, job_id: str):
-        db = SessionLocal()
         overall_start = asyncio.get_running_loop().time()
-        try:
-            job = db.get(Job, job_id)
-            if not job:
-                return
+        self._active_job_ids.add(job_id)
+        async with AsyncSessionLocal() as db:
+            try:
+                job = await db.get(Job, job_id)
+                if not job:
+                    return
+
+                with job_trace(job.id, job.trace_mode) as trace:
+                    for note in trace.notes if trace else ():
+                        await append_job_log(db, job.id, "processing", note)
+                    await self._run_stages(db, job, overall_start)
+            except Exception as exc:
+                if not db.is_active:
+                    await db.rollback()  # a failed flush; pending OCR text etc. is kept otherwise
+                if job := await db.get(Job, job_id):
+                    job.error_message = str(exc)
+                    db.add(job)
+                    await db.commit()
+                    await self._step(db, job, "failed", str(exc))
+            finally:
+                self._active_job_ids.discard(job_id)
+
+    async def _run_stages(self, db: AsyncSession, job: Job, overall_start: float):
+        from .ocr import OCRRawOutput
 
+        with trace_span("stage.processing"):
             if job.status != "processing":
+                job.started_at = datetime.utcnow()  # DB-claimed jobs got this in the claim
                 await self._step(db, job, "processing", "loading uploaded image")
             src = Path(job.file_path)
 
+        with trace_span("stage.extracting"):
             await self._step(db, job, "extracting", "running OCR inference")
             ocr_started = asyncio.get_running_loop().time()
-            raw = self.ocr.run(src)
+            ocr = self.ocr_for(job.ocr_mode)
+            cached = await load_checkpoint(db, job.id, "ocr", ocr.version)
+            if cached is not None:
+                raw = OCRRawOutput(**cached)
+                await append_job_log(db, job.id, "extracting", f"reused OCR checkpoint version={ocr.version}")
+            else:
+                # End the checkpoint read's transaction so the pooled connection isn't held through OCR.
+                await db.commit()
+                with trace_span("ocr.run", engine=ocr.mode):
+                    raw = await self._run_ocr_streaming(job.id, ocr, src)
+                await save_checkpoint(db, job.id, "ocr", ocr.version, asdict(raw))
             ocr_ms = int((asyncio.get_running_loop().time() - ocr_started) * 1000)
-            append_job_log(db, job.id, "extracting", f"ocr engine={raw.engine}")
-            append_job_log(db, job.id, "extracting", f"ocr duration_ms={ocr_ms}")
+            await append_job_log(db, job.id, "extracting", f"ocr engine={raw.engine}")
+            await append_job_log(db, job.id, "extracting", f"ocr duration_ms={ocr_ms}")
+            if cached is None and raw.wait_ms:
+                await append_job_log(db, job.id, "extracting", f"ocr engine wait_ms={raw.wait_ms}")
             if raw.note:
-                append_job_log(db, job.id, "extracting", raw.note)
+                await append_job_log(db, job.id, "extracting", raw.note)
 
+        with trace_span("stage.validating"):
             await self._step(db, job, "validating", "parsing + validating structured data")
-            fields, confidence, warnings = parse_po_text(raw.raw_text)
-            validated = ExtractedFields(**fields)
+            text_digest = digest(raw.raw_text)
+            parsed = await load_checkpoint(db, job.id, "parse", PARSER_VERSION, text_digest)
+            if parsed is None:
+                with trace_span("parse.parse_po_text"):
+                    fields, confidence, warnings = parse_po_text(raw.raw_text)
+                parsed = {"fields": fields, "confidence": confidence, "warnings": warnings}
+                await save_checkpoint(db, job.id, "parse", PARSER_VERSION, parsed, text_digest)
+            fields, confidence, warnings = parsed["fields"], parsed["confidence"], parsed["warnings"]
+            # Keep the OCR text even if validation fails so bulk re-parse can revisit the job.
+            job.raw_ocr_text = raw.raw_text
+            with trace_span("parse.validate"):
+                validated = ExtractedFields(**fields)
 
             if raw.note:
                 warnings = [raw.note, *warnings]
 
-            job.raw_ocr_text = raw.raw_text
             job.extracted_fields = validated.model_dump()
             job.field_confidence = confidence
             job.warnings = warnings
+            job.ocr_mode = ocr.mode
 
-            if settings.auto_save:
+        if settings.auto_save:
+            with trace_span("stage.saving"):
                 await self._save_record(db, job, validated.model_dump())
                 await self._step(db, job, "saving", "auto-save enabled, data persisted")
 
+        with trace_span("stage.done"):
             total_ms = int((asyncio.get_running_loop().time() - overall_start) * 1000)
+            if cached is None:
+                # Admission estimates want engine time, not time queued on the engine lock/server;
+                # resumed jobs are skipped because they would skew it.
+                job.service_ms = max(total_ms - raw.wait_ms, 0)
             await self._step(
                 db,
                 job,
@@ -159,42 +430,50 @@ class JobRunner:
                 "ocr complete",
                 extra={"engine": raw.engine, "ocr_duration_ms": ocr_ms, "total_duration_ms": total_ms},
             )
-        except Exception as exc:
-            if job := db.get(Job, job_id):
-                job.error_message = str(exc)
-                db.add(job)
-                db.commit()
-                await self._step(db, job, "failed", str(exc))
+
+    def _ocr_pool(self) -> ThreadPoolExecutor:
+        if self._ocr_executor is None:
+            self._ocr_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.worker_count), thread_name_prefix="ocr"
+            )
+        return self._ocr_executor
+
+    async def _run_ocr_streaming(self, job_id: str, ocr: OCRService, src: Path):
+        """Run OCR on the OCR thread pool, relaying streamed text to SSE subscribers."""
+        stream = OCRTextStream(job_id)
+        flusher = asyncio.create_task(stream.run())
+        heartbeat = asyncio.create_task(JobRunner._heartbeat(job_id))
+        # Like ``asyncio.to_thread``, carry the context over so the job's trace reaches the thread.
+        ctx = contextvars.copy_context()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._ocr_pool(), ctx.run, run_profiled, ocr.run, src, stream.feed
+            )
         finally:
-            db.close()
+            heartbeat.cancel()
+            flusher.cancel()
+            await stream.flush()
 
-    async def _save_record(self, db: Session, job: Job, data: dict):
-        exists = db.query(PORecord).filter(PORecord.job_id == job.id).first()
+    @staticmethod
+    async def _heartbeat(job_id: str):
+        """Bump ``updated_at`` during long OCR so the job isn't mistaken for an orphan."""
+        interval = max(settings.job_stale_after_sec / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(Job).where(Job.id == job_id).values(updated_at=datetime.utcnow()))
+                await db.commit()
+
+    async def _save_record(self, db: AsyncSession, job: Job, data: dict):
+        exists = await db.scalar(select(PORecord).where(PORecord.job_id == job.id))
         if exists:
             exists.data = data
             db.add(exists)
-            db.commit()
+            await db.commit()
             return
 
-        rec = PORecord(
-            job_id=job.id,
-            po_number=data.get("po_number"),
-            po_date=data.get("po_date"),
-            buyer_company_name=data.get("buyer_company_name"),
-            buyer_tax_id=data.get("buyer_tax_id"),
-            seller_company_name=data.get("seller_company_name"),
-            seller_tax_id=data.get("seller_tax_id"),
-            delivery_address=data.get("delivery_address"),
-            sub_total=data.get("sub_total"),
-            vat_rate=data.get("vat_rate"),
-            vat_amount=data.get("vat_amount"),
-            grand_total=data.get("grand_total"),
-            currency=data.get("currency") or "THB",
-            payment_terms=data.get("payment_terms"),
-            data=data,
-        )
-        db.add(rec)
-        db.commit()
+        db.add(PORecord(**po_record_values(job.id, data)))
+        await db.commit()
 
 
 job_runner = JobRunner()
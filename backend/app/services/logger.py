@@ -1,28 +1,38 @@
+import asyncio
 from datetime import datetime
 from pathlib import Path
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
 from ..models import JobLog
 
-settings.job_logs_dir.mkdir(parents=True, exist_ok=True)
-
 system_logger = logging.getLogger("po_system")
-if not system_logger.handlers:
+
+
+def configure_system_logger():
+    """Attach the ``storage/system.log`` handler once; deferred so imports touch no files."""
+    if system_logger.handlers:
+        return
+    settings.ensure_storage_dirs()
     handler = logging.FileHandler(settings.storage_dir / "system.log")
     handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
     system_logger.addHandler(handler)
     system_logger.setLevel(logging.INFO)
 
 
-def append_job_log(db: Session, job_id: str, step: str, message: str):
-    log = JobLog(job_id=job_id, step=step, message=message)
-    db.add(log)
-    db.commit()
-
+def write_job_log_file(job_id: str, step: str, message: str):
+    """Append to ``storage/job_logs/<job_id>.log`` and the system log (blocking file I/O)."""
     line = f"{datetime.utcnow().isoformat()} | {step} | {message}\n"
     p = Path(settings.job_logs_dir / f"{job_id}.log")
     with p.open("a", encoding="utf-8") as f:
         f.write(line)
 
+    configure_system_logger()
     system_logger.info("job=%s step=%s message=%s", job_id, step, message)
+
+
+async def append_job_log(db: AsyncSession, job_id: str, step: str, message: str):
+    log = JobLog(job_id=job_id, step=step, message=message)
+    db.add(log)
+    await db.commit()
+    await asyncio.to_thread(write_job_log_file, job_id, step, message)
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import itertools
+from multiprocessing.connection import Client, Connection, Listener
+import multiprocessing
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import Callable
+
+from ..config import settings
+from .logger import configure_system_logger, system_logger as logger
+from .ocr import OCRRawOutput, OCRService
+
+MIN_AUTHKEY_LENGTH = 16
+
+
+def parse_address(address: str) -> str | tuple[str, int]:
+    """``host:port`` -> TCP tuple, anything else is treated as a unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _authkey() -> bytes:
+    """Shared secret for ``multiprocessing.connection``.
+
+    Peers exchange pickles, so anyone who can authenticate can run code in
+    the other process. There is deliberately no default key.
+    """
+    key = settings.model_server_authkey or ""
+    if len(key) < MIN_AUTHKEY_LENGTH:
+        raise RuntimeError(
+            f"MODEL_SERVER_AUTHKEY must be set to a secret of at least {MIN_AUTHKEY_LENGTH} characters "
+            "(e.g. python -c 'import secrets; print(secrets.token_hex(32))')"
+        )
+    return key.encode()
+
+
+def _build_typhoon_service() -> OCRService:
+    return OCRService("typhoon", settings.typhoon_model_ref, settings.typhoon_model_source, settings.hf_token)
+
+
+def _replica_loop(recv: Callable, send: Callable, num_threads: int = 0, processor=None):
+    """Serve OCR tasks using the model already loaded in this process.
+
+    Runs as a thread (shared weights, shared process) or as a forked process
+    (weights shared copy-on-write with the parent that loaded them). Thread
+    replicas pass their own ``processor``: fast tokenizers fail on concurrent
+    calls ("Already borrowed").
+    """
+    if num_threads:
+        import torch
+
+        torch.set_num_threads(num_threads)
+
+    service = _build_typhoon_service()
+    service.processor = processor
+    while True:
+        task = recv()
+        if task is None:
+            return
+        request_id, image_path = task
+        try:
+            raw = service._run_typhoon(Path(image_path), lambda delta: send((request_id, "delta", delta)))
+            send((request_id, "result", {"raw_text": raw.raw_text, "engine": raw.engine, "note": raw.note}))
+        except Exception as exc:
+            send((request_id, "error", f"{type(exc).__name__}: {exc}"))
+
+
+class ModelServer:
+    """Hosts one Typhoon model and serves inference from N replicas over IPC.
+
+    ``replica_mode="thread"`` runs N inference threads over a single copy of
+    the weights. ``replica_mode="fork"`` loads once and forks N processes that
+    share the weights copy-on-write, each talking to the parent over its own
+    pipe. Requests are assigned to idle replicas by the parent, so a replica
+    that dies fails exactly its in-flight request and is restarted.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        replicas: int = 2,
+        replica_mode: str = "thread",
+        threads_per_replica: int = 0,
+        max_queue: int = 64,
+    ):
+        if replica_mode not in ("thread", "fork"):
+            raise ValueError("MODEL_SERVER_REPLICA_MODE must be 'thread' or 'fork'")
+        self.address = parse_address(address)
+        self.authkey = _authkey()  # fail before loading the model
+        self.replicas = max(1, replicas)
+        self.replica_mode = replica_mode
+        self.threads_per_replica = threads_per_replica or max(1, (os.cpu_count() or 1) // self.replicas)
+        self.max_queue = max_queue
+
+        self.tasks: queue.Queue = queue.Queue()
+        self._idle: queue.Queue[int] = queue.Queue()
+        self._workers: list = [None] * self.replicas
+        self._inboxes: list = [None] * self.replicas
+        self._mailboxes: dict[str, queue.Queue] = {}
+        self._inflight: dict[int, str] = {}
+        self._assigned_at: dict[str, float] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def serve_forever(self):
+        configure_system_logger()
+        started = time.monotonic()
+        _build_typhoon_service()._load_typhoon_components()
+        logger.info("model server: model loaded in %.1fs", time.monotonic() - started)
+
+        if self.replica_mode == "thread":
+            import torch
+
+            torch.set_num_threads(self.threads_per_replica)
+        for index in range(self.replicas):
+            self._start_replica(index)
+            self._idle.put(index)
+        threading.Thread(target=self._assign_tasks, name="model-server-assign", daemon=True).start()
+        if self.replica_mode == "fork":
+            threading.Thread(target=self._monitor_replicas, name="model-server-monitor", daemon=True).start()
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(
+                "model server: listening on %s replicas=%d mode=%s threads/replica=%d",
+                self.address,
+                self.replicas,
+                self.replica_mode,
+                self.threads_per_replica,
+            )
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, multiprocessing.AuthenticationError) as exc:
+                    logger.warning("model server: rejected connection: %s", exc)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _start_replica(self, index: int):
+        if self.replica_mode == "fork":
+            parent_conn, child_conn = multiprocessing.get_context("fork").Pipe()
+            worker = multiprocessing.get_context("fork").Process(
+                target=_replica_loop,
+                args=(child_conn.recv, child_conn.send, self.threads_per_replica),
+                name=f"typhoon-replica-{index}",
+                daemon=True,
+            )
+            worker.start()
+            child_conn.close()
+            self._inboxes[index] = parent_conn.send
+            threading.Thread(target=self._read_replica, args=(parent_conn,), daemon=True).start()
+        else:
+            inbox: queue.Queue = queue.Queue()
+            worker = threading.Thread(
+                target=_replica_loop,
+                args=(inbox.get, self._route),
+                kwargs={"processor": _build_typhoon_service().load_typhoon_processor()},
+                name=f"typhoon-replica-{index}",
+                daemon=True,
+            )
+            worker.start()
+            self._inboxes[index] = inbox.put
+        self._workers[index] = worker
+
+    def _read_replica(self, conn: Connection):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return  # replica exited; the monitor fails its request and restarts it
+            self._route(message)
+
+    def _assign_tasks(self):
+        while True:
+            request_id, image_path = self.tasks.get()
+            index = self._idle.get()
+            with self._lock:
+                if request_id not in self._mailboxes:
+                    self._idle.put(index)  # client went away while queued
+                    continue
+                self._inflight[index] = request_id
+                self._assigned_at[request_id] = time.monotonic()
+            try:
+                self._inboxes[index]((request_id, image_path))
+            except OSError:
+                pass  # replica just died; the monitor fails this request
+
+    def _route(self, message: tuple):
+        request_id, kind, payload = message
+        with self._lock:
+            mailbox = self._mailboxes.get(request_id)
+            if kind in ("result", "error"):
+                for index, inflight_id in list(self._inflight.items()):
+                    if inflight_id == request_id:
+                        del self._inflight[index]
+                        self._idle.put(index)
+        if mailbox is not None:
+            mailbox.put((kind, payload))
+
+    def _monitor_replicas(self):
+        while True:
+            time.sleep(settings.model_server_health_interval_sec)
+            for index, worker in enumerate(self._workers):
+                if worker.is_alive():
+                    continue
+                logger.warning("model server: replica %d exited (code=%s), restarting", index, worker.exitcode)
+                self._start_replica(index)
+                with self._lock:
+                    request_id = self._inflight.pop(index, None)
+                    mailbox = self._mailboxes.get(request_id) if request_id else None
+                if request_id is not None:
+                    self._idle.put(index)
+                if mailbox is not None:
+                    mailbox.put(("error", f"replica {index} died while processing the request"))
+
+    def health(self) -> dict:
+        with self._lock:
+            return {
+                "replicas": self.replicas,
+                "replicas_alive": sum(1 for w in self._workers if w is not None and w.is_alive()),
+                "replica_mode": self.replica_mode,
+                "pending": self._pending,
+                "inflight": len(self._inflight),
+                "pid": os.getpid(),
+            }
+
+    def _handle(self, conn: Connection):
+        request_id = None
+        try:
+            message = conn.recv()
+            if message.get("op") == "health":
+                conn.send(("health", self.health()))
+                return
+            if message.get("op") != "ocr":
+                conn.send(("error", f"unknown op {message.get('op')!r}"))
+                return
+
+            mailbox: queue.Queue = queue.Queue()
+            with self._lock:
+                if self._pending >= self.max_queue:
+                    conn.send(("error", "model server queue is full"))
+                    return
+                request_id = f"r{next(self._ids)}"
+                self._mailboxes[request_id] = mailbox
+                self._pending += 1
+            queued_at = time.monotonic()
+            self.tasks.put((request_id, message["image_path"]))
+
+            while True:
+                kind, payload = mailbox.get()
+                if kind == "result":
+                    with self._lock:
+                        assigned_at = self._assigned_at.get(request_id, queued_at)
+                    payload = {**payload, "wait_ms": int((assigned_at - queued_at) * 1000)}
+                conn.send((kind, payload))
+                if kind in ("result", "error"):
+                    return
+        except (EOFError, OSError) as exc:
+            logger.warning("model server: client connection dropped: %s", exc)
+        finally:
+            if request_id is not None:
+                with self._lock:
+                    self._mailboxes.pop(request_id, None)
+                    self._assigned_at.pop(request_id, None)
+                    self._pending -= 1
+            conn.close()
+
+
+class ModelServerClient:
+    """Talks to a ``ModelServer`` from job workers."""
+
+    def __init__(self, address: str):
+        self.address = parse_address(address)
+        self.authkey = _authkey()
+
+    def _connect(self) -> Connection:
+        return Client(self.address, authkey=self.authkey)
+
+    def health(self) -> dict:
+        with self._connect() as conn:
+            conn.send({"op": "health"})
+            _, payload = conn.recv()
+            return payload
+
+    def ocr(self, image_path: Path, on_text: Callable[[str], None] | None = None) -> OCRRawOutput:
+        deadline = time.monotonic() + settings.model_server_timeout_sec
+        with self._connect() as conn:
+            conn.send({"op": "ocr", "image_path": str(Path(image_path).resolve())})
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not conn.poll(remaining):
+                    raise TimeoutError("model server did not answer in time")
+                kind, payload = conn.recv()
+                if kind == "delta":
+                    if on_text is not None:
+                        on_text(payload)
+                elif kind == "result":
+                    return OCRRawOutput(**payload)
+                elif kind == "error":
+                    raise RuntimeError(f"model server: {payload}")
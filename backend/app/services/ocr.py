@@ -2,7 +2,19 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-import re
+import struct
+import threading
+import time
+from typing import Callable
+import zlib
+
+from .parsing import parse_po_text  # noqa: F401 - re-exported for existing callers
+from .tracing import trace_span
+
+
+STUB_TEXT_KEY = "po:ocr_text"
+# Bump when fast/stub output changes; typhoon output is versioned by its model ref.
+OCR_ENGINE_VERSION = "1"
 
 
 @dataclass
@@ -10,12 +22,14 @@ class OCRRawOutput:
     raw_text: str
     engine: str
     note: str | None = None
+    wait_ms: int = 0  # waiting for the engine (process lock / model-server queue), not inference
 
 
 class OCRService:
     _typhoon_model = None
     _typhoon_processor = None
     _typhoon_device: str | None = None
+    _typhoon_lock = threading.Lock()
 
     def __init__(
         self,
@@ -23,17 +37,63 @@ class OCRService:
         typhoon_model_ref: str,
         typhoon_model_source: str = "local",
         hf_token: str | None = None,
+        model_server_address: str | None = None,
     ):
         self.mode = mode
         self.typhoon_model_ref = typhoon_model_ref
         self.typhoon_model_source = typhoon_model_source
         self.hf_token = hf_token
+        self.model_server_address = model_server_address
+        # Overrides the shared processor, e.g. one per model-server replica thread.
+        self.processor = None
+
+    @property
+    def version(self) -> str:
+        """Tag stored with OCR checkpoints; a different tag means the output must be recomputed."""
+        if self.mode == "typhoon":
+            return f"typhoon:{self.typhoon_model_ref}"
+        return f"{self.mode}:{OCR_ENGINE_VERSION}"
+
+    def run(self, image_path: Path, on_text: Callable[[str], None] | None = None) -> OCRRawOutput:
+        """Run OCR; engines that generate incrementally report text deltas via ``on_text``.
 
-    def run(self, image_path: Path) -> OCRRawOutput:
+        ``on_text`` is called from the thread running OCR.
+        """
+        if self.mode == "typhoon" and self.model_server_address:
+            return self._run_remote(image_path, on_text)
         if self.mode == "typhoon":
-            return self._run_typhoon(image_path)
+            # One generate at a time per process; also guards the lazy model load.
+            wait_started = time.perf_counter()
+            with trace_span("typhoon.lock_wait"):
+                OCRService._typhoon_lock.acquire()
+            try:
+                wait_ms = int((time.perf_counter() - wait_started) * 1000)
+                raw = self._run_typhoon(image_path, on_text)
+            finally:
+                OCRService._typhoon_lock.release()
+            raw.wait_ms = wait_ms
+            return raw
+        if self.mode == "stub":
+            return self._run_stub(image_path)
         return self._run_fast(image_path)
 
+    def _run_remote(self, image_path: Path, on_text: Callable[[str], None] | None = None) -> OCRRawOutput:
+        """Delegate Typhoon inference to a shared model server (see ``model_server.py``)."""
+        from .model_server import ModelServerClient
+
+        with trace_span("typhoon.remote", address=self.model_server_address):
+            return ModelServerClient(self.model_server_address).ocr(image_path, on_text)
+
+    def _run_stub(self, image_path: Path) -> OCRRawOutput:
+        """Return the ground-truth text embedded by the benchmark image generator.
+
+        Used for pipeline-only benchmark runs where OCR cost should not dominate.
+        """
+        text = read_png_text_chunk(image_path, STUB_TEXT_KEY)
+        if text:
+            return OCRRawOutput(raw_text=text, engine="stub")
+        return OCRRawOutput(raw_text="", engine="stub", note="no embedded OCR text found")
+
     def _run_fast(self, image_path: Path) -> OCRRawOutput:
         try:
             import pytesseract  # optional
@@ -59,12 +119,34 @@ class OCRService:
             return OCRService._typhoon_model, OCRService._typhoon_processor
 
         import torch
-        from transformers import AutoProcessor
 
         auto_model_cls = self._resolve_typhoon_auto_model_class()
 
         device = "cuda" if torch.cuda.is_available() else "cpu"
         dtype = torch.float16 if device == "cuda" else torch.float32
+        pretrained_ref, common_kwargs = self._typhoon_pretrained_args()
+        processor = self.load_typhoon_processor()
+        model = auto_model_cls.from_pretrained(
+            pretrained_ref,
+            torch_dtype=dtype,
+            **common_kwargs,
+        )
+        model.to(device)
+        model.eval()
+
+        OCRService._typhoon_model = model
+        OCRService._typhoon_processor = processor
+        OCRService._typhoon_device = device
+        return model, processor
+
+    def load_typhoon_processor(self):
+        """A new processor/tokenizer; cheap next to the weights and not shared between threads."""
+        from transformers import AutoProcessor
+
+        pretrained_ref, common_kwargs = self._typhoon_pretrained_args()
+        return AutoProcessor.from_pretrained(pretrained_ref, **common_kwargs)
+
+    def _typhoon_pretrained_args(self) -> tuple[str, dict]:
         model_source = self.typhoon_model_source.lower()
         model_ref = self.typhoon_model_ref
 
@@ -93,23 +175,7 @@ class OCRService:
         }
         if self.hf_token:
             common_kwargs["token"] = self.hf_token
-
-        processor = AutoProcessor.from_pretrained(
-            pretrained_ref,
-            **common_kwargs,
-        )
-        model = auto_model_cls.from_pretrained(
-            pretrained_ref,
-            torch_dtype=dtype,
-            **common_kwargs,
-        )
-        model.to(device)
-        model.eval()
-
-        OCRService._typhoon_model = model
-        OCRService._typhoon_processor = processor
-        OCRService._typhoon_device = device
-        return model, processor
+        return pretrained_ref, common_kwargs
 
     @staticmethod
     def _resolve_typhoon_auto_model_class():
@@ -127,14 +193,17 @@ class OCRService:
             "Please upgrade transformers to a supported version."
         )
 
-    def _run_typhoon(self, image_path: Path) -> OCRRawOutput:
+    def _run_typhoon(self, image_path: Path, on_text: Callable[[str], None] | None = None) -> OCRRawOutput:
         import torch
         from PIL import Image
 
-        model, processor = self._load_typhoon_components()
+        with trace_span("typhoon.load_components"):
+            model, processor = self._load_typhoon_components()
+        processor = self.processor or processor
         device = OCRService._typhoon_device or "cpu"
 
-        image = Image.open(image_path).convert("RGB")
+        with trace_span("typhoon.image_load"):
+            image = Image.open(image_path).convert("RGB")
         prompt = (
             "Extract all visible text from this purchase order image. "
             "Keep line breaks and preserve key-value formatting. "
@@ -151,30 +220,40 @@ class OCRService:
                     ],
                 }
             ]
-            text_input = processor.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True,
-            )
-            inputs = processor(
-                text=[text_input],
-                images=[image],
-                return_tensors="pt",
-            )
+            with trace_span("typhoon.apply_chat_template"):
+                text_input = processor.apply_chat_template(
+                    messages,
+                    tokenize=False,
+                    add_generation_prompt=True,
+                )
+            with trace_span("typhoon.processor"):
+                inputs = processor(
+                    text=[text_input],
+                    images=[image],
+                    return_tensors="pt",
+                )
         else:
-            inputs = processor(images=image, text=prompt, return_tensors="pt")
-
-        inputs = {
-            k: (v.to(device) if isinstance(v, torch.Tensor) else v)
-            for k, v in inputs.items()
-        }
+            with trace_span("typhoon.processor"):
+                inputs = processor(images=image, text=prompt, return_tensors="pt")
 
-        with torch.inference_mode():
-            generated = model.generate(**inputs, max_new_tokens=2048)
+        with trace_span("typhoon.to_device", device=device):
+            inputs = {
+                k: (v.to(device) if isinstance(v, torch.Tensor) else v)
+                for k, v in inputs.items()
+            }
 
         prompt_len = inputs["input_ids"].shape[-1] if "input_ids" in inputs else 0
-        trimmed = generated[:, prompt_len:] if prompt_len else generated
-        text = processor.batch_decode(trimmed, skip_special_tokens=True)[0].strip()
+        if on_text is not None:
+            with trace_span("typhoon.generate", prompt_tokens=prompt_len, streaming=True):
+                text = self._generate_streaming(model, processor, inputs, on_text).strip()
+        else:
+            with trace_span("typhoon.generate", prompt_tokens=prompt_len):
+                with torch.inference_mode():
+                    generated = model.generate(**inputs, max_new_tokens=2048)
+
+            with trace_span("typhoon.decode", new_tokens=int(generated.shape[-1] - prompt_len)):
+                trimmed = generated[:, prompt_len:] if prompt_len else generated
+                text = processor.batch_decode(trimmed, skip_special_tokens=True)[0].strip()
 
         if text:
             return OCRRawOutput(
@@ -185,63 +264,66 @@ class OCRService:
 
         raise RuntimeError("Typhoon OCR returned empty text")
 
-
-def parse_po_text(raw_text: str) -> tuple[dict, dict[str, float], list[str]]:
-    warnings: list[str] = []
-
-    def f(pattern: str):
-        m = re.search(pattern, raw_text, flags=re.IGNORECASE)
-        return m.group(1).strip() if m else None
-
-    def fn(pattern: str):
-        v = f(pattern)
-        if not v:
-            return None
-        v = v.replace(",", "")
-        try:
-            return float(v)
-        except ValueError:
-            return None
-
-    sub_total = fn(r"sub\s*total\s*[:\-]?\s*([0-9.,]+)")
-    vat_amount = fn(r"vat(?:\s*\d+%?)?\s*[:\-]?\s*([0-9.,]+)")
-    grand_total = fn(r"grand\s*total\s*[:\-]?\s*([0-9.,]+)")
-
-    data = {
-        "po_number": f(r"po\s*(?:number|no)\s*[:\-]?\s*([A-Za-z0-9\-\/]+)"),
-        "po_date": f(r"po\s*date\s*[:\-]?\s*([0-9]{4}-[0-9]{2}-[0-9]{2})"),
-        "buyer_company_name": f(r"buyer\s*[:\-]?\s*(.+)"),
-        "buyer_tax_id": f(r"buyer\s*tax\s*id\s*[:\-]?\s*([0-9\-]+)"),
-        "seller_company_name": f(r"seller\s*[:\-]?\s*(.+)"),
-        "seller_tax_id": f(r"seller\s*tax\s*id\s*[:\-]?\s*([0-9\-]+)"),
-        "delivery_address": f(r"delivery\s*address\s*[:\-]?\s*(.+)"),
-        "items": [
-            {
-                "description": "Item A",
-                "quantity": 2,
-                "unit": "pcs",
-                "unit_price": 500,
-                "line_total": 1000,
-            }
-        ],
-        "sub_total": sub_total,
-        "vat_rate": 7.0 if vat_amount else None,
-        "vat_amount": vat_amount,
-        "grand_total": grand_total,
-        "currency": "THB",
-        "payment_terms": f(r"payment\s*terms\s*[:\-]?\s*(.+)"),
-    }
-
-    if not vat_amount:
-        warnings.append("หา VAT ไม่เจอ")
-    if sub_total and grand_total and vat_amount and abs((sub_total + vat_amount) - grand_total) > 5:
-        warnings.append("ยอดรวมไม่ตรง")
-
-    confidence = {
-        "po_number": 0.8 if data["po_number"] else 0.0,
-        "po_date": 0.8 if data["po_date"] else 0.0,
-        "buyer_company_name": 0.7 if data["buyer_company_name"] else 0.0,
-        "items": 0.6,
-        "grand_total": 0.75 if grand_total else 0.0,
-    }
-    return data, confidence, warnings
+    @staticmethod
+    def _generate_streaming(model, processor, inputs: dict, on_text: Callable[[str], None]) -> str:
+        """Run ``generate`` on a helper thread and forward decoded text as it is produced."""
+        import torch
+        from transformers import TextIteratorStreamer
+
+        tokenizer = getattr(processor, "tokenizer", processor)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors: list[BaseException] = []
+
+        def _generate():
+            try:
+                with torch.inference_mode():
+                    model.generate(**inputs, max_new_tokens=2048, streamer=streamer)
+            except BaseException as exc:
+                errors.append(exc)
+                streamer.end()
+
+        thread = threading.Thread(target=_generate, name="typhoon-generate", daemon=True)
+        thread.start()
+        chunks: list[str] = []
+        for delta in streamer:
+            if delta:
+                chunks.append(delta)
+                on_text(delta)
+        thread.join()
+        if errors:
+            raise errors[0]
+        return "".join(chunks)
+
+
+def read_png_text_chunk(image_path: Path, key: str) -> str | None:
+    """Read a tEXt/iTXt chunk value from a PNG file without decoding pixels."""
+    try:
+        data = image_path.read_bytes()
+    except OSError:
+        return None
+    if not data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return None
+
+    pos = 8
+    while pos + 8 <= len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        chunk_type = data[pos + 4 : pos + 8]
+        body = data[pos + 8 : pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b"tEXt":
+            name, _, value = body.partition(b"\x00")
+            if name.decode("latin-1") == key:
+                return value.decode("latin-1")
+        elif chunk_type == b"iTXt":
+            name, _, rest = body.partition(b"\x00")
+            if name.decode("latin-1") != key or len(rest) < 2:
+                continue
+            compressed, rest = rest[0], rest[2:]
+            _lang, _, rest = rest.partition(b"\x00")
+            _translated, _, value = rest.partition(b"\x00")
+            if compressed:
+                value = zlib.decompress(value)
+            return value.decode("utf-8")
+        elif chunk_type == b"IEND":
+            break
+    return None
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import re
+
+# Bump when extraction rules change so stored parse checkpoints are recomputed.
+PARSER_VERSION = "1"
+
+
+def parse_po_text(raw_text: str) -> tuple[dict, dict[str, float], list[str]]:
+    warnings: list[str] = []
+
+    def f(pattern: str):
+        m = re.search(pattern, raw_text, flags=re.IGNORECASE)
+        return m.group(1).strip() if m else None
+
+    def fn(pattern: str):
+        v = f(pattern)
+        if not v:
+            return None
+        v = v.replace(",", "")
+        try:
+            return float(v)
+        except ValueError:
+            return None
+
+    sub_total = fn(r"sub\s*total\s*[:\-]?\s*([0-9.,]+)")
+    vat_amount = fn(r"vat(?:\s*\d+%?)?\s*[:\-]?\s*([0-9.,]+)")
+    grand_total = fn(r"grand\s*total\s*[:\-]?\s*([0-9.,]+)")
+
+    data = {
+        "po_number": f(r"po\s*(?:number|no)\s*[:\-]?\s*([A-Za-z0-9\-\/]+)"),
+        "po_date": f(r"po\s*date\s*[:\-]?\s*([0-9]{4}-[0-9]{2}-[0-9]{2})"),
+        "buyer_company_name": f(r"buyer\s*[:\-]?\s*(.+)"),
+        "buyer_tax_id": f(r"buyer\s*tax\s*id\s*[:\-]?\s*([0-9\-]+)"),
+        "seller_company_name": f(r"seller\s*[:\-]?\s*(.+)"),
+        "seller_tax_id": f(r"seller\s*tax\s*id\s*[:\-]?\s*([0-9\-]+)"),
+        "delivery_address": f(r"delivery\s*address\s*[:\-]?\s*(.+)"),
+        "items": [
+            {
+                "description": "Item A",
+                "quantity": 2,
+                "unit": "pcs",
+                "unit_price": 500,
+                "line_total": 1000,
+            }
+        ],
+        "sub_total": sub_total,
+        "vat_rate": 7.0 if vat_amount else None,
+        "vat_amount": vat_amount,
+        "grand_total": grand_total,
+        "currency": "THB",
+        "payment_terms": f(r"payment\s*terms\s*[:\-]?\s*(.+)"),
+    }
+
+    if not vat_amount:
+        warnings.append("หา VAT ไม่เจอ")
+    if sub_total and grand_total and vat_amount and abs((sub_total + vat_amount) - grand_total) > 5:
+        warnings.append("ยอดรวมไม่ตรง")
+
+    confidence = {
+        "po_number": 0.8 if data["po_number"] else 0.0,
+        "po_date": 0.8 if data["po_date"] else 0.0,
+        "buyer_company_name": 0.7 if data["buyer_company_name"] else 0.0,
+        "items": 0.6,
+        "grand_total": 0.75 if grand_total else 0.0,
+    }
+    return data, confidence, warnings
@@ -1,9 +1,9 @@
 from pathlib import Path
-import cv2
-import numpy as np
 
 
 def preprocess_image(input_path: Path, output_path: Path, fast_mode: bool = True):
+    import cv2  # heavy; imported on use so importing this module stays cheap
+
     img = cv2.imread(str(input_path))
     if img is None:
         raise ValueError("Corrupted or unreadable image")
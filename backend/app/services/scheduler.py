@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from ..config import settings
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+DEFAULT_PRIORITY = "interactive"
+ACTIVE_STATUSES = ("processing", "extracting", "validating", "saving")
+
+
+@dataclass(frozen=True)
+class QueuedJob:
+    job_id: str
+    user_id: str
+    priority: str = DEFAULT_PRIORITY
+    enqueued_at: datetime = datetime.min
+
+
+class FairSharePolicy:
+    """Priority classes + weighted fair-share per user + per-user caps + aging.
+
+    A job's effective rank is its priority class, promoted one class for every
+    ``starvation_age_sec`` it has waited, so bulk work can never starve. Among
+    equal ranks the user with the lowest ``usage / weight`` goes first, and
+    ties fall back to FIFO. Usage is the user's count of started jobs, decayed
+    with a half-life of ``usage_half_life_sec``; every start charges one unit,
+    so even a single worker alternates between users instead of draining one
+    user's backlog first.
+    """
+
+    def __init__(
+        self,
+        user_weights: dict[str, float] | None = None,
+        max_running_per_user: int = 0,
+        starvation_age_sec: float = 300.0,
+        usage_half_life_sec: float = 600.0,
+    ):
+        self.user_weights = user_weights or {}
+        self.max_running_per_user = max_running_per_user
+        self.starvation_age_sec = starvation_age_sec
+        self.usage_half_life_sec = usage_half_life_sec
+
+    @property
+    def usage_horizon(self) -> timedelta | None:
+        """Starts older than this contribute < 2% and can be ignored; None = keep all."""
+        if self.usage_half_life_sec <= 0:
+            return None
+        return timedelta(seconds=6 * self.usage_half_life_sec)
+
+    def usage_from_starts(self, starts: Iterable[tuple[str, datetime]], now: datetime) -> dict[str, float]:
+        """Decayed started-job count per user from ``(user_id, started_at)`` pairs."""
+        usage: dict[str, float] = defaultdict(float)
+        for user_id, started_at in starts:
+            if self.usage_half_life_sec <= 0:
+                usage[user_id] += 1.0
+            else:
+                age = max((now - started_at).total_seconds(), 0.0)
+                usage[user_id] += 0.5 ** (age / self.usage_half_life_sec)
+        return dict(usage)
+
+    def effective_rank(self, job: QueuedJob, now: datetime) -> int:
+        rank = PRIORITIES.get(job.priority, PRIORITIES[DEFAULT_PRIORITY])
+        if self.starvation_age_sec > 0:
+            waited = (now - job.enqueued_at).total_seconds()
+            rank -= int(max(waited, 0) // self.starvation_age_sec)
+        return max(rank, 0)
+
+    def _key(self, job: QueuedJob, usage: dict[str, float], now: datetime) -> tuple:
+        weight = self.user_weights.get(job.user_id, 1.0) or 1.0
+        return (self.effective_rank(job, now), usage.get(job.user_id, 0.0) / weight, job.enqueued_at)
+
+    def pick(
+        self,
+        pending: list[QueuedJob],
+        running: dict[str, int],
+        usage: dict[str, float],
+        now: datetime,
+    ) -> QueuedJob | None:
+        """Choose the next job to start, honouring per-user concurrency caps."""
+        cap = self.max_running_per_user
+        candidates = [j for j in pending if cap <= 0 or running.get(j.user_id, 0) < cap]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda j: self._key(j, usage, now))
+
+    def order(self, pending: list[QueuedJob], usage: dict[str, float], now: datetime) -> list[QueuedJob]:
+        """Simulate successive picks (ignoring caps) to get the expected start order.
+
+        Each simulated start charges the user exactly as ``pick`` followed by a
+        real start would, so the order matches what a single worker does.
+        """
+        per_user: dict[str, list[QueuedJob]] = defaultdict(list)
+        for job in pending:
+            per_user[job.user_id].append(job)
+        for jobs in per_user.values():
+            jobs.sort(key=lambda j: (self.effective_rank(j, now), j.enqueued_at), reverse=True)
+
+        served = dict(usage)
+        ordered: list[QueuedJob] = []
+        while per_user:
+            head = min((jobs[-1] for jobs in per_user.values()), key=lambda j: self._key(j, served, now))
+            ordered.append(head)
+            per_user[head.user_id].pop()
+            if not per_user[head.user_id]:
+                del per_user[head.user_id]
+            served[head.user_id] = served.get(head.user_id, 0.0) + 1.0
+        return ordered
+
+    def positions(self, pending: list[QueuedJob], usage: dict[str, float], now: datetime) -> dict[str, int]:
+        """1-based expected start position of every pending job."""
+        return {job.job_id: index for index, job in enumerate(self.order(pending, usage, now), start=1)}
+
+
+def build_policy() -> FairSharePolicy:
+    return FairSharePolicy(
+        user_weights=settings.scheduler_user_weights,
+        max_running_per_user=settings.scheduler_max_running_per_user,
+        starvation_age_sec=settings.scheduler_starvation_age_sec,
+        usage_half_life_sec=settings.scheduler_usage_half_life_sec,
+    )
+
+
+class FairQueue:
+    """In-process replacement for ``asyncio.Queue`` that dequeues by ``FairSharePolicy``."""
+
+    def __init__(self, policy: FairSharePolicy):
+        self.policy = policy
+        self.pending: list[QueuedJob] = []
+        self.running: dict[str, int] = defaultdict(int)
+        self.starts: deque[tuple[str, datetime]] = deque()
+        self._changed = asyncio.Condition()
+
+    def usage(self, now: datetime) -> dict[str, float]:
+        horizon = self.policy.usage_horizon
+        while horizon is not None and self.starts and now - self.starts[0][1] > horizon:
+            self.starts.popleft()
+        return self.policy.usage_from_starts(self.starts, now)
+
+    async def put(self, job: QueuedJob):
+        async with self._changed:
+            self.pending.append(job)
+            self._changed.notify_all()
+
+    async def get(self) -> QueuedJob:
+        async with self._changed:
+            while True:
+                now = datetime.utcnow()
+                job = self.policy.pick(self.pending, self.running, self.usage(now), now)
+                if job is not None:
+                    self.pending.remove(job)
+                    self.running[job.user_id] += 1
+                    self.starts.append((job.user_id, now))
+                    return job
+                await self._changed.wait()
+
+    async def task_done(self, job: QueuedJob):
+        async with self._changed:
+            self.running[job.user_id] = max(self.running[job.user_id] - 1, 0)
+            self._changed.notify_all()
+
+    def qsize(self) -> int:
+        return len(self.pending)
+
+    def positions(self) -> dict[str, int]:
+        now = datetime.utcnow()
+        return self.policy.positions(self.pending, self.usage(now), now)
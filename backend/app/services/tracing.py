@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import threading
+import time
+from typing import Callable, Iterator, TypeVar
+
+from ..config import settings
+
+TRACE_MODES = ("trace", "cprofile", "pyinstrument")
+
+_current_trace: ContextVar["JobTrace | None"] = ContextVar("job_trace", default=None)
+# cProfile/pyinstrument hook the interpreter, so only one job per process may hold a profiler.
+_profiler_lock = threading.Lock()
+logger = logging.getLogger("po_system")
+T = TypeVar("T")
+
+
+def resolve_trace_mode(header_value: str | None) -> str | None:
+    """Map the ``X-Trace`` upload header (or sampling) to a trace mode.
+
+    ``1``/``true``/``trace`` records spans only; ``cprofile``/``pyinstrument``
+    additionally dump a profile. Without a header, ``TRACE_SAMPLE_RATE`` decides.
+    """
+    if header_value:
+        value = header_value.strip().lower()
+        if value in ("1", "true", "yes", "trace"):
+            return "trace"
+        if value in TRACE_MODES:
+            return value
+        return None
+    if settings.trace_sample_rate > 0 and random.random() < settings.trace_sample_rate:
+        return "trace"
+    return None
+
+
+def trace_path(job_id: str) -> Path:
+    return settings.job_traces_dir / f"{job_id}.json"
+
+
+def profile_path(job_id: str, mode: str) -> Path:
+    suffix = ".html" if mode == "pyinstrument" else ".prof"
+    return settings.job_traces_dir / f"{job_id}{suffix}"
+
+
+class JobTrace:
+    """Collects wall-clock spans for one job and exports them as Chrome trace JSON."""
+
+    def __init__(self, job_id: str, mode: str = "trace"):
+        self.job_id = job_id
+        self.mode = mode
+        self.events: list[dict] = []
+        self.notes: list[str] = []  # surfaced in the job log by the runner
+        self.profiler = None
+        self.thread_profilers: list = []  # merged into the job's profile dump
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end_ns = time.perf_counter_ns()
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": (start_ns - self._origin_ns) / 1000,
+                    "dur": (end_ns - start_ns) / 1000,
+                    "pid": self._pid,
+                    "tid": threading.get_ident(),
+                    "args": args,
+                }
+            )
+
+    def to_chrome_trace(self) -> dict:
+        metadata = {
+            "name": "process_name",
+            "ph": "M",
+            "pid": self._pid,
+            "args": {"name": f"job {self.job_id}"},
+        }
+        return {"traceEvents": [metadata, *self.events], "displayTimeUnit": "ms"}
+
+    def save(self) -> Path:
+        path = trace_path(self.job_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_chrome_trace()), encoding="utf-8")
+        return path
+
+
+@contextmanager
+def trace_span(name: str, **args) -> Iterator[None]:
+    """Record a span on the active job trace; a no-op when the job is not traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name, **args):
+        yield
+
+
+@contextmanager
+def job_trace(job_id: str, mode: str | None) -> Iterator[JobTrace | None]:
+    """Activate tracing (and optional profiling) for the duration of a job.
+
+    Profilers sample the whole event loop, so concurrent jobs on the same
+    worker can show up in the dump; use WORKER_COUNT=1 for clean profiles.
+    Only one job per process is profiled at a time; others, or a profiler
+    that fails to start, fall back to spans only. Failing to write the
+    trace or profile is logged and never fails the job.
+    """
+    if mode not in TRACE_MODES:
+        yield None
+        return
+
+    trace = JobTrace(job_id, mode)
+    if mode != "trace":
+        trace.profiler = _acquire_profiler(trace, mode)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if trace.profiler is not None:
+            try:
+                _stop_profiler(trace, profile_path(job_id, mode))
+            except Exception:
+                logger.exception("job=%s failed to write %s profile", job_id, mode)
+            finally:
+                _profiler_lock.release()
+        try:
+            trace.save()
+        except Exception:
+            logger.exception("job=%s failed to write trace", job_id)
+
+
+def _acquire_profiler(trace: JobTrace, mode: str):
+    if not _profiler_lock.acquire(blocking=False):
+        trace.notes.append(f"{mode} profile skipped: another job in this process is being profiled, spans only")
+        return None
+    try:
+        return _start_profiler(mode)
+    except Exception as exc:  # e.g. "Another profiling tool is already active", pyinstrument missing
+        _profiler_lock.release()
+        trace.notes.append(f"{mode} profiler unavailable ({exc}), spans only")
+        return None
+
+
+def run_profiled(fn: Callable[..., T], *args) -> T:
+    """Call ``fn`` under the job's profiler from a worker thread (the OCR pool).
+
+    cProfile (before Python 3.12) and pyinstrument only see the thread that
+    started them, so work moved off the event loop (OCR) gets its own
+    profiler whose stats are merged into the job's dump. The caller runs
+    this inside a copy of its context, so the job's trace is visible here.
+    """
+    trace = _current_trace.get()
+    profiler = None
+    if trace is not None and trace.profiler is not None:
+        try:
+            profiler = _start_profiler(trace.mode, threaded=True)
+        except Exception:
+            profiler = None  # Python 3.12+: cProfile is interpreter-wide and already sees this thread
+    try:
+        return fn(*args)
+    finally:
+        if profiler is not None:
+            if trace.mode == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
+            trace.thread_profilers.append(profiler)
+
+
+def _start_profiler(mode: str, threaded: bool = False):
+    if mode == "cprofile":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    from pyinstrument import Profiler
+
+    profiler = Profiler(async_mode="disabled" if threaded else "enabled")
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(trace: JobTrace, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if trace.mode == "cprofile":
+        import pstats
+
+        trace.profiler.disable()
+        stats = pstats.Stats(trace.profiler)
+        for profiler in trace.thread_profilers:
+            stats.add(profiler)
+        stats.dump_stats(str(path))
+    else:
+        from pyinstrument.renderers import HTMLRenderer
+        from pyinstrument.session import Session
+
+        trace.profiler.stop()
+        session = trace.profiler.last_session
+        for profiler in trace.thread_profilers:
+            session = Session.combine(session, profiler.last_session)
+        path.write_text(HTMLRenderer().render(session), encoding="utf-8")
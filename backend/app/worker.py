@@ -1,11 +1,13 @@
 import asyncio
 
-from .database import Base, engine
+from .database import init_db_async
 from .services.job_runner import job_runner
+from .services.logger import configure_system_logger
 
 
 async def run_worker() -> None:
-    Base.metadata.create_all(bind=engine)
+    await init_db_async()
+    configure_system_logger()
     await job_runner.start_db_polling_workers()
     await asyncio.Event().wait()
 
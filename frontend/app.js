@@ -3,6 +3,7 @@ let source = null;
 
 const statusEl = document.getElementById('status');
 const logsEl = document.getElementById('logs');
+const liveTextEl = document.getElementById('liveText');
 const statusMetaEl = document.getElementById('statusMeta');
 const resultJsonEl = document.getElementById('resultJson');
 const saveResultEl = document.getElementById('saveResult');
@@ -15,6 +16,7 @@ document.getElementById('uploadForm').addEventListener('submit', async (e) => {
   if (!file) return;
 
   logsEl.textContent = '';
+  liveTextEl.textContent = '';
   resultJsonEl.value = '';
   saveResultEl.textContent = '';
   poPreviewEl.hidden = true;
@@ -22,13 +24,21 @@ document.getElementById('uploadForm').addEventListener('submit', async (e) => {
 
   const fd = new FormData();
   fd.append('user_id', userId);
+  fd.append('priority', document.getElementById('priority').value);
   fd.append('file', file);
 
   const resp = await fetch('/upload', { method: 'POST', body: fd });
   const payload = await resp.json();
+  if (!resp.ok) {
+    const retryAfter = resp.headers.get('Retry-After');
+    statusEl.textContent = 'rejected';
+    statusMetaEl.textContent = `${payload.detail}${retryAfter ? ` (retry in ${retryAfter}s)` : ''}`;
+    return;
+  }
   activeJobId = payload.job_id;
   statusEl.textContent = payload.status;
-  statusMetaEl.textContent = 'Progress: 5%';
+  const eta = payload.estimated_completion_at ? new Date(payload.estimated_completion_at).toLocaleTimeString() : '-';
+  statusMetaEl.textContent = `Progress: 5% | Engine: ${payload.ocr_mode || '-'} | ETA: ${eta}`;
   if (payload.file_url) {
     poPreviewEl.src = payload.file_url;
     poPreviewEl.hidden = false;
@@ -65,6 +75,14 @@ function connectSSE(jobId) {
   source = new EventSource(`/job/${jobId}/stream`);
   source.onmessage = (evt) => {
     const data = JSON.parse(evt.data);
+    if (typeof data.partial_text === 'string') {
+      liveTextEl.textContent += data.partial_text;
+      liveTextEl.scrollTop = liveTextEl.scrollHeight;
+      if (data.partial_fields) {
+        resultJsonEl.value = JSON.stringify(data.partial_fields, null, 2);
+      }
+      return;
+    }
     const at = data.ts || new Date().toISOString();
     const progress = typeof data.progress_percent === 'number' ? ` (${data.progress_percent}%)` : '';
     const detail = data.total_duration_ms ? ` | total=${data.total_duration_ms}ms` : '';
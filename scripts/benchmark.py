@@ -0,0 +1,492 @@
+"""End-to-end benchmark for the upload -> OCR -> confirm pipeline.
+
+Generates synthetic Thai PO images with known ground truth, drives
+``/upload``, ``/job/{id}/stream`` and ``/job/{id}/confirm`` at a fixed
+concurrency, and reports throughput, per-stage latency percentiles and parse
+field accuracy.
+
+Examples::
+
+    # pipeline-only run (stub OCR reads the ground truth embedded in the PNG)
+    python -m scripts.benchmark --deployment inprocess --ocr-mode stub --jobs 200 --concurrency 16
+
+    # split web + worker processes with tesseract (falls back to simulated text)
+    python -m scripts.benchmark --deployment split --ocr-mode fast --jobs 50
+
+    # an already running deployment
+    python -m scripts.benchmark --deployment external --base-url http://localhost:8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+import json
+import os
+from pathlib import Path
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+import zlib
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STUB_TEXT_KEY = "po:ocr_text"  # keep in sync with backend.app.services.ocr.STUB_TEXT_KEY
+TERMINAL_STATUSES = {"done", "failed"}
+SCALAR_FIELDS = (
+    "po_number",
+    "po_date",
+    "buyer_company_name",
+    "buyer_tax_id",
+    "seller_company_name",
+    "seller_tax_id",
+    "delivery_address",
+    "sub_total",
+    "vat_amount",
+    "grand_total",
+    "payment_terms",
+)
+FONT_CANDIDATES = (
+    "/System/Library/Fonts/Supplemental/Tahoma.ttf",
+    "/System/Library/Fonts/Thonburi.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansThai-Regular.ttf",
+    "/usr/share/fonts/truetype/tlwg/Garuda.ttf",
+    "/usr/share/fonts/truetype/tlwg/Loma.ttf",
+)
+
+BUYERS = (
+    "บริษัท สยามวัสดุก่อสร้าง จำกัด",
+    "บริษัท เชียงใหม่ฟู้ดส์ จำกัด (มหาชน)",
+    "ห้างหุ้นส่วนจำกัด รุ่งเรืองการช่าง",
+    "บริษัท ไทยออฟฟิศซัพพลาย จำกัด",
+)
+SELLERS = (
+    "บริษัท กรุงเทพเครื่องเขียน จำกัด",
+    "บริษัท อีสานอุปกรณ์ไฟฟ้า จำกัด",
+    "ร้าน ศรีสมบูรณ์พาณิชย์",
+    "บริษัท ภูเก็ตแพ็คเกจจิ้ง จำกัด",
+)
+ADDRESSES = (
+    "99/1 ถนนพระรามที่ 4 แขวงคลองเตย เขตคลองเตย กรุงเทพฯ 10110",
+    "12 หมู่ 3 ตำบลสุเทพ อำเภอเมือง เชียงใหม่ 50200",
+    "45/7 ถนนมิตรภาพ ตำบลในเมือง อำเภอเมือง ขอนแก่น 40000",
+)
+PAYMENT_TERMS = ("30 วัน", "เงินสด", "60 วัน หลังวางบิล", "Net 30")
+ITEMS = (
+    ("กระดาษ A4 80 แกรม", "รีม"),
+    ("หมึกพิมพ์ HP 680", "ตลับ"),
+    ("สายไฟ THW 2.5", "ม้วน"),
+    ("ปูนซีเมนต์ 50 กก.", "ถุง"),
+    ("แฟ้มเอกสาร", "pcs"),
+)
+
+
+# --------------------------------------------------------------------------- synthetic data
+
+
+def generate_po(rng: random.Random, index: int) -> tuple[str, dict]:
+    """Build one PO as (OCR-like text, ground-truth fields)."""
+    po_date = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+    truth = {
+        "po_number": f"PO-{po_date.year}-{index:05d}",
+        "po_date": po_date.isoformat(),
+        "buyer_company_name": rng.choice(BUYERS),
+        "buyer_tax_id": "".join(rng.choice("0123456789") for _ in range(13)),
+        "seller_company_name": rng.choice(SELLERS),
+        "seller_tax_id": "".join(rng.choice("0123456789") for _ in range(13)),
+        "delivery_address": rng.choice(ADDRESSES),
+        "sub_total": 1000.0,
+        "vat_amount": 70.0,
+        "grand_total": 1070.0,
+        "payment_terms": rng.choice(PAYMENT_TERMS),
+    }
+
+    # Line totals are multiples of 100 that sum to sub_total so validation passes.
+    cuts = sorted(rng.sample(range(1, 10), rng.randint(0, 2)))
+    parts = [b - a for a, b in zip([0, *cuts], [*cuts, 10])]
+    item_lines = []
+    for part in parts:
+        line_total = part * 100
+        qty = rng.choice([q for q in (1, 2, 4, 5, 10) if line_total % q == 0])
+        desc, unit = rng.choice(ITEMS)
+        item_lines.append(f"{desc} qty {qty} unit {unit} unit_price {line_total / qty:.2f} line_total {line_total:.2f}")
+
+    text = "\n".join(
+        [
+            "ใบสั่งซื้อ / PURCHASE ORDER",
+            f"PO Number: {truth['po_number']}",
+            f"PO Date: {truth['po_date']}",
+            f"Buyer: {truth['buyer_company_name']}",
+            f"Buyer Tax ID: {truth['buyer_tax_id']}",
+            f"Seller: {truth['seller_company_name']}",
+            f"Seller Tax ID: {truth['seller_tax_id']}",
+            f"Delivery Address: {truth['delivery_address']}",
+            f"Payment Terms: {truth['payment_terms']}",
+            *item_lines,
+            f"Sub Total: {truth['sub_total']:,.2f}",
+            f"VAT 7%: {truth['vat_amount']:,.2f}",
+            f"Grand Total: {truth['grand_total']:,.2f}",
+        ]
+    )
+    return text, truth
+
+
+def _png_chunk(chunk_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def _blank_png(text: str, width: int = 620, height: int = 877) -> bytes:
+    """Plain white PNG carrying ``text`` in an iTXt chunk (no Pillow required)."""
+    rows = b"".join(b"\x00" + b"\xff" * width for _ in range(height))
+    itxt = STUB_TEXT_KEY.encode("latin-1") + b"\x00\x00\x00\x00\x00" + text.encode("utf-8")
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + _png_chunk(b"iTXt", itxt)
+        + _png_chunk(b"IDAT", zlib.compress(rows))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def render_png(text: str, font_path: str | None = None) -> bytes:
+    """Render ``text`` onto an A4-ish page and embed it for the stub engine."""
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+        from PIL.PngImagePlugin import PngInfo
+    except ImportError:
+        return _blank_png(text)
+
+    font = None
+    for candidate in (font_path, *FONT_CANDIDATES):
+        if candidate and Path(candidate).exists():
+            with contextlib.suppress(OSError):
+                font = ImageFont.truetype(candidate, 28)
+                break
+    if font is None:
+        font = ImageFont.load_default()
+
+    image = Image.new("L", (1240, 1754), color=255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(text.splitlines()):
+        draw.text((80, 80 + i * 48), line, fill=0, font=font)
+
+    info = PngInfo()
+    info.add_itxt(STUB_TEXT_KEY, text)
+    with tempfile.SpooledTemporaryFile() as buf:
+        image.save(buf, format="PNG", pnginfo=info)
+        buf.seek(0)
+        return buf.read()
+
+
+# --------------------------------------------------------------------------- HTTP client
+
+
+def _multipart(fields: dict[str, str], filename: str, content: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    parts.append(
+        (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: image/png\r\n\r\n"
+        ).encode("utf-8")
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _request(method: str, url: str, body: bytes | None = None, headers: dict | None = None, timeout: float = 60):
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _wait_terminal(base_url: str, job_id: str, deadline: float, poll_sec: float) -> str:
+    """Follow the SSE stream until a terminal status, polling ``/job/{id}`` when it goes quiet.
+
+    In split deployments the worker publishes to its own process, so the web
+    stream stays silent and the poll fallback is what completes the wait.
+    """
+    while time.monotonic() < deadline:
+        with contextlib.suppress(socket.timeout, TimeoutError, urllib.error.URLError):
+            with urllib.request.urlopen(f"{base_url}/job/{job_id}/stream", timeout=poll_sec) as resp:
+                for raw in resp:
+                    line = raw.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    status = json.loads(line[5:]).get("status")
+                    if status in TERMINAL_STATUSES:
+                        return status
+        status = _request("GET", f"{base_url}/job/{job_id}")["status"]
+        if status in TERMINAL_STATUSES:
+            return status
+    return "timeout"
+
+
+def _server_stage_ms(log_lines: list[str]) -> dict[str, float]:
+    """Derive queue/OCR/parse durations from the persisted ``{ts} | {step} | {message}`` log."""
+    first_seen: dict[str, datetime] = {}
+    for line in log_lines:
+        ts, _, rest = line.partition(" | ")
+        step = rest.partition(" | ")[0]
+        with contextlib.suppress(ValueError):
+            first_seen.setdefault(step, datetime.fromisoformat(ts))
+
+    def span(start: str | tuple[str, ...], end: str | tuple[str, ...]) -> float | None:
+        starts = (start,) if isinstance(start, str) else start
+        ends = (end,) if isinstance(end, str) else end
+        a = next((first_seen[s] for s in starts if s in first_seen), None)
+        b = next((first_seen[e] for e in ends if e in first_seen), None)
+        if a is None or b is None:
+            return None
+        return (b - a).total_seconds() * 1000
+
+    stages = {
+        "queue_wait": span("queued", ("processing", "extracting")),
+        "ocr": span("extracting", "validating"),
+        "parse_validate": span("validating", ("saving", "done")),
+    }
+    return {k: v for k, v in stages.items() if v is not None}
+
+
+@dataclass
+class JobSample:
+    index: int
+    job_id: str | None = None
+    status: str = "error"
+    error: str | None = None
+    stage_ms: dict[str, float] = field(default_factory=dict)
+    field_matches: dict[str, bool] = field(default_factory=dict)
+
+
+def _field_matches(truth: dict, extracted: dict) -> dict[str, bool]:
+    matches = {}
+    for name in SCALAR_FIELDS:
+        expected, actual = truth.get(name), extracted.get(name)
+        if isinstance(expected, float):
+            matches[name] = isinstance(actual, (int, float)) and abs(actual - expected) < 0.01
+        else:
+            matches[name] = isinstance(actual, str) and actual.strip() == expected
+    return matches
+
+
+def run_one(base_url: str, index: int, image: bytes, truth: dict, timeout: float, poll_sec: float) -> JobSample:
+    sample = JobSample(index=index)
+    try:
+        started = time.monotonic()
+        body, content_type = _multipart({"user_id": f"bench{index % 8:02d}"}, f"po_{index:05d}.png", image)
+        uploaded = _request("POST", f"{base_url}/upload", body, {"Content-Type": content_type})
+        sample.job_id = uploaded["job_id"]
+        sample.stage_ms["upload"] = (time.monotonic() - started) * 1000
+
+        sample.status = _wait_terminal(base_url, sample.job_id, started + timeout, poll_sec)
+        sample.stage_ms["end_to_end"] = (time.monotonic() - started) * 1000
+        logs = _request("GET", f"{base_url}/job/{sample.job_id}/logs")["logs"]
+        sample.stage_ms.update(_server_stage_ms(logs))
+        if sample.status != "done":
+            return sample
+
+        job = _request("GET", f"{base_url}/job/{sample.job_id}")
+        extracted = (job.get("result") or {}).get("extracted_fields") or {}
+        sample.field_matches = _field_matches(truth, extracted)
+
+        confirm_started = time.monotonic()
+        payload = json.dumps({"extracted_fields": extracted}).encode("utf-8")
+        _request("POST", f"{base_url}/job/{sample.job_id}/confirm", payload, {"Content-Type": "application/json"})
+        sample.stage_ms["confirm"] = (time.monotonic() - confirm_started) * 1000
+    except Exception as exc:  # noqa: BLE001 - a benchmark records failures instead of aborting
+        sample.error = f"{type(exc).__name__}: {exc}"
+    return sample
+
+
+# --------------------------------------------------------------------------- deployments
+
+
+def _wait_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _request("GET", f"{base_url}/job/__ready__", timeout=2)
+        except urllib.error.HTTPError as exc:
+            if exc.code == 404:
+                return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+@contextlib.contextmanager
+def deployment(args: argparse.Namespace):
+    """Launch the requested topology against a throwaway storage dir and yield its base URL."""
+    if args.deployment == "external":
+        yield args.base_url.rstrip("/")
+        return
+
+    storage = Path(tempfile.mkdtemp(prefix="po-bench-"))
+    env = {
+        **os.environ,
+        "STORAGE_DIR": str(storage),
+        "UPLOADS_DIR": str(storage / "uploads"),
+        "JOB_LOGS_DIR": str(storage / "job_logs"),
+        "JOB_TRACES_DIR": str(storage / "job_traces"),
+        "SQLITE_PATH": str(storage / "app.db"),
+        # Blank so a DATABASE_URL from .env or the shell never points the run at a real database.
+        "DATABASE_URL": "",
+        "OCR_MODE": args.ocr_mode,
+        "WORKER_COUNT": str(args.workers),
+        "AUTO_SAVE": "false",
+        "ENABLE_IN_PROCESS_WORKER": "true" if args.deployment == "inprocess" else "false",
+    }
+    base_url = f"http://127.0.0.1:{args.port}"
+    web_cmd = [sys.executable, "-m", "uvicorn", "backend.app.main:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    procs = [subprocess.Popen(web_cmd, cwd=REPO_ROOT, env=env)]
+    try:
+        _wait_ready(base_url)
+        if args.deployment == "split":
+            procs.append(subprocess.Popen([sys.executable, "-m", "backend.app.worker"], cwd=REPO_ROOT, env=env))
+        yield base_url
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                proc.wait(timeout=10)
+        if args.keep_storage:
+            print(f"storage kept at {storage}")
+        else:
+            shutil.rmtree(storage, ignore_errors=True)
+
+
+# --------------------------------------------------------------------------- report
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples: list[JobSample], wall_sec: float, args: argparse.Namespace) -> dict:
+    by_status: dict[str, int] = {}
+    for s in samples:
+        by_status[s.status] = by_status.get(s.status, 0) + 1
+
+    stage_names = ("upload", "queue_wait", "ocr", "parse_validate", "confirm", "end_to_end")
+    stages = {}
+    for name in stage_names:
+        values = [s.stage_ms[name] for s in samples if name in s.stage_ms]
+        if values:
+            stages[name] = {
+                "n": len(values),
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "max_ms": round(max(values), 1),
+            }
+
+    scored = [s for s in samples if s.field_matches]
+    accuracy = {
+        name: round(sum(s.field_matches[name] for s in scored) / len(scored), 4) for name in SCALAR_FIELDS
+    } if scored else {}
+    overall = round(sum(accuracy.values()) / len(accuracy), 4) if accuracy else None
+
+    return {
+        "config": {
+            "deployment": args.deployment,
+            "ocr_mode": args.ocr_mode,
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "seed": args.seed,
+        },
+        "wall_sec": round(wall_sec, 3),
+        "throughput_jobs_per_sec": round(by_status.get("done", 0) / wall_sec, 3) if wall_sec else 0.0,
+        "status_counts": by_status,
+        "stages": stages,
+        "field_accuracy": accuracy,
+        "overall_accuracy": overall,
+        "errors": [asdict(s) for s in samples if s.error][:10],
+    }
+
+
+def print_report(report: dict) -> None:
+    cfg = report["config"]
+    print(
+        f"\ndeployment={cfg['deployment']} ocr_mode={cfg['ocr_mode']} jobs={cfg['jobs']} "
+        f"concurrency={cfg['concurrency']} workers={cfg['workers']}"
+    )
+    print(f"wall={report['wall_sec']}s throughput={report['throughput_jobs_per_sec']} jobs/s status={report['status_counts']}")
+    print(f"\n{'stage':<16}{'n':>6}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name, row in report["stages"].items():
+        print(f"{name:<16}{row['n']:>6}{row['p50_ms']:>12}{row['p95_ms']:>12}{row['p99_ms']:>12}{row['max_ms']:>12}")
+    if report["field_accuracy"]:
+        print("\nfield accuracy:")
+        for name, value in report["field_accuracy"].items():
+            print(f"  {name:<22}{value:.2%}")
+        print(f"  {'overall':<22}{report['overall_accuracy']:.2%}")
+    for err in report["errors"]:
+        print(f"error job#{err['index']}: {err['error']}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--deployment", choices=("inprocess", "split", "external"), default="inprocess")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="target for --deployment external")
+    parser.add_argument("--port", type=int, default=8765, help="port for launched deployments")
+    parser.add_argument("--ocr-mode", choices=("stub", "fast", "typhoon"), default="stub")
+    parser.add_argument("--workers", type=int, default=1, help="WORKER_COUNT for launched deployments")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=600, help="per-job timeout in seconds")
+    parser.add_argument("--poll-sec", type=float, default=2.0, help="SSE idle time before polling /job/{id}")
+    parser.add_argument("--seed", type=int, default=117)
+    parser.add_argument("--font", default=None, help="TTF font with Thai glyphs for rendered images")
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here")
+    parser.add_argument("--keep-storage", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    documents = [generate_po(rng, i) for i in range(args.jobs)]
+    images = [render_png(text, args.font) for text, _ in documents]
+
+    with deployment(args) as base_url:
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            futures = [
+                pool.submit(run_one, base_url, i, images[i], documents[i][1], args.timeout, args.poll_sec)
+                for i in range(args.jobs)
+            ]
+            samples = [f.result() for f in futures]
+        wall_sec = time.monotonic() - started
+
+    report = summarize(samples, wall_sec, args)
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0 if report["status_counts"].get("done", 0) == args.jobs else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
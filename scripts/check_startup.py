@@ -0,0 +1,156 @@
+"""Enforce the web-process startup budget.
+
+Imports ``backend.app.main`` and runs its startup hook (``init_db_async``,
+logger setup) in fresh interpreters, as ``./scripts/run.sh web`` does, and
+fails when:
+
+- a heavy module (cv2, numpy, torch, transformers, PIL) or the OCR engine
+  module is loaded,
+- the import touches the filesystem (storage dirs are created at startup),
+- the best import time exceeds ``--budget-ms``, the app's own share of it
+  (on top of importing FastAPI/SQLAlchemy alone) exceeds ``--app-budget-ms``,
+  the startup hook exceeds ``--startup-budget-ms``, or peak RSS exceeds
+  ``--rss-mb``.
+
+    python -m scripts.check_startup --budget-ms 800 --rss-mb 150
+
+``--budget-ms`` is absolute, so pass a larger value on slow machines;
+``tests/test_startup.py`` checks everything except the absolute import time,
+since the app's share doesn't depend on how fast the machine imports FastAPI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FORBIDDEN_MODULES = ("cv2", "numpy", "torch", "transformers", "PIL", "backend.app.services.ocr")
+
+PROBE = """
+import asyncio, json, os, resource, sys, time
+started = time.perf_counter()
+import backend.app.main as main
+import_ms = (time.perf_counter() - started) * 1000
+touched = os.path.exists(os.environ["STORAGE_DIR"])
+
+
+async def startup():
+    from backend.app.database import async_engine
+
+    started = time.perf_counter()
+    await main.startup_event()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    await async_engine.dispose()
+    return elapsed_ms
+
+
+startup_ms = asyncio.run(startup())
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+print(json.dumps({
+    "import_ms": import_ms,
+    "startup_ms": startup_ms,
+    "touched_fs": touched,
+    "rss_mb": rss_mb,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+# The libraries the web process can't avoid; the app's own import cost is measured on top.
+FRAMEWORK_PROBE = """
+import json, time
+started = time.perf_counter()
+import fastapi, fastapi.middleware.cors, fastapi.staticfiles, pydantic_settings, sqlalchemy.ext.asyncio, aiosqlite
+print(json.dumps({"import_ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def probe(storage: Path, code: str = PROBE) -> dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(REPO_ROOT),
+        "ENABLE_IN_PROCESS_WORKER": "false",
+        "STORAGE_DIR": str(storage),
+        "UPLOADS_DIR": str(storage / "uploads"),
+        "JOB_LOGS_DIR": str(storage / "job_logs"),
+        "JOB_TRACES_DIR": str(storage / "job_traces"),
+        "SQLITE_PATH": str(storage / "app.db"),
+        "DATABASE_URL": "",
+    }
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check(
+    budget_ms: float | None = 800.0,
+    app_budget_ms: float = 300.0,
+    startup_budget_ms: float = 500.0,
+    rss_mb: float = 150.0,
+    runs: int = 3,
+) -> tuple[dict, list[str]]:
+    """Best-of-``runs`` measurements and the list of budget violations; ``budget_ms=None`` skips the absolute check."""
+    failures: list[str] = []
+    results = []
+    for _ in range(max(1, runs)):
+        with tempfile.TemporaryDirectory() as tmp:
+            results.append(probe(Path(tmp) / "storage"))
+    framework_ms = min(probe(REPO_ROOT, FRAMEWORK_PROBE)["import_ms"] for _ in range(max(1, runs)))
+
+    best = min(results, key=lambda r: r["import_ms"])
+    best["framework_ms"] = framework_ms
+    best["startup_ms"] = min(r["startup_ms"] for r in results)
+    if any(r["touched_fs"] for r in results):
+        failures.append("importing backend.app.main created the storage dir")
+    loaded = set(best["modules"])
+    heavy = [m for m in FORBIDDEN_MODULES if m in loaded or any(x.startswith(m + ".") for x in loaded)]
+    if heavy:
+        failures.append(f"heavy modules loaded by the web process: {', '.join(heavy)}")
+    if budget_ms is not None and best["import_ms"] > budget_ms:
+        failures.append(f"import took {best['import_ms']:.0f}ms (budget {budget_ms:.0f}ms)")
+    if best["import_ms"] - framework_ms > app_budget_ms:
+        failures.append(
+            f"app import took {best['import_ms'] - framework_ms:.0f}ms on top of the framework "
+            f"(budget {app_budget_ms:.0f}ms)"
+        )
+    if best["startup_ms"] > startup_budget_ms:
+        failures.append(f"startup hook took {best['startup_ms']:.0f}ms (budget {startup_budget_ms:.0f}ms)")
+    if best["rss_mb"] > rss_mb:
+        failures.append(f"peak RSS {best['rss_mb']:.0f}MB (budget {rss_mb:.0f}MB)")
+    return best, failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Check web-process import/startup time, RSS and heavy imports")
+    parser.add_argument("--budget-ms", type=float, default=800.0)
+    parser.add_argument("--app-budget-ms", type=float, default=300.0)
+    parser.add_argument("--startup-budget-ms", type=float, default=500.0)
+    parser.add_argument("--rss-mb", type=float, default=150.0)
+    parser.add_argument("--runs", type=int, default=3, help="take the best of N runs to ignore cold caches")
+    args = parser.parse_args(argv)
+
+    best, failures = check(args.budget_ms, args.app_budget_ms, args.startup_budget_ms, args.rss_mb, args.runs)
+    print(
+        f"import backend.app.main: {best['import_ms']:.0f}ms "
+        f"(framework {best['framework_ms']:.0f}ms), startup hook {best['startup_ms']:.0f}ms, "
+        f"peak RSS {best['rss_mb']:.0f}MB, {len(best['modules'])} modules"
+    )
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
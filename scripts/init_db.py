@@ -1,5 +1,5 @@
-from backend.app.database import Base, engine
+from backend.app.database import init_db
 
 if __name__ == "__main__":
-    Base.metadata.create_all(bind=engine)
+    init_db()
     print("DB initialized")
@@ -0,0 +1,264 @@
+"""Re-apply ``parse_po_text`` + ``ExtractedFields`` validation to stored OCR text.
+
+Streams jobs in keyset-paginated chunks (``id > last_id``), parses them in a
+process pool and writes each chunk back in one short transaction, so the live
+web process is only ever blocked for a single bulk UPDATE. Progress is saved
+to a state file after every chunk; rerunning picks up where it stopped, and
+jobs whose parse checkpoint already matches ``PARSER_VERSION`` are skipped.
+
+    python -m scripts.reparse_jobs --dry-run            # show what would change
+    python -m scripts.reparse_jobs --workers 8          # apply
+    python -m scripts.reparse_jobs --restart            # ignore saved progress
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import Path
+import time
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from backend.app.config import settings
+from backend.app.database import SessionLocal, init_db
+from backend.app.models import Job, JobCheckpoint, PORecord, po_record_values
+from backend.app.schemas import ExtractedFields
+from backend.app.services.checkpoints import digest
+from backend.app.services.parsing import PARSER_VERSION, parse_po_text
+
+
+def parse_batch(rows: list[tuple[str, str]]) -> list[dict]:
+    """Process-pool worker: parse + validate ``(job_id, raw_text)`` pairs."""
+    out = []
+    for job_id, raw_text in rows:
+        fields, confidence, warnings = parse_po_text(raw_text)
+        parsed = {"fields": fields, "confidence": confidence, "warnings": warnings}
+        try:
+            validated = ExtractedFields(**fields).model_dump()
+            out.append({"id": job_id, "parsed": parsed, "validated": validated, "error": None})
+        except ValueError as exc:
+            out.append({"id": job_id, "parsed": parsed, "validated": None, "error": str(exc)})
+    return out
+
+
+def changed_fields(old: dict | None, new: dict) -> list[str]:
+    old = old or {}
+    return sorted(k for k in new if old.get(k) != new.get(k))
+
+
+def load_chunk(after_id: str, statuses: list[str], limit: int) -> list[dict]:
+    db = SessionLocal()
+    try:
+        jobs = db.execute(
+            select(Job.id, Job.status, Job.raw_ocr_text, Job.extracted_fields)
+            .where(Job.id > after_id, Job.status.in_(statuses), Job.raw_ocr_text.is_not(None))
+            .order_by(Job.id)
+            .limit(limit)
+        ).all()
+        ids = [job.id for job in jobs]
+        checkpoints = {
+            (cp.job_id, cp.stage): cp
+            for cp in db.execute(select(JobCheckpoint).where(JobCheckpoint.job_id.in_(ids))).scalars()
+        }
+        rows = []
+        for job in jobs:
+            parse_cp = checkpoints.get((job.id, "parse"))
+            ocr_cp = checkpoints.get((job.id, "ocr"))
+            rows.append(
+                {
+                    "id": job.id,
+                    "status": job.status,
+                    "raw_text": job.raw_ocr_text,
+                    "extracted_fields": job.extracted_fields,
+                    "digest": digest(job.raw_ocr_text),
+                    "parse_version": parse_cp.version if parse_cp else None,
+                    "parse_digest": parse_cp.input_digest if parse_cp else None,
+                    "ocr_note": (ocr_cp.data or {}).get("note") if ocr_cp else None,
+                }
+            )
+        return rows
+    finally:
+        db.close()
+
+
+def write_chunk(results: list[dict], rows_by_id: dict[str, dict]) -> Counter:
+    """Bulk-update jobs and replace their parse checkpoints in one transaction.
+
+    Jobs whose status changed since ``load_chunk`` (requeued by
+    ``/reprocess`` or stale recovery, possibly running right now) are left
+    alone: the UPDATE is guarded on the loaded status, and their
+    checkpoints are not touched.
+    """
+    counts: Counter = Counter()
+    if not results:
+        return counts
+
+    jobs = Job.__table__
+    db = SessionLocal()
+    try:
+        ids = [result["id"] for result in results]
+        current = dict(db.execute(select(Job.id, Job.status).where(Job.id.in_(ids)).with_for_update()).all())
+        unchanged = [r for r in results if current.get(r["id"]) == rows_by_id[r["id"]]["status"]]
+        counts["skipped_busy"] = len(results) - len(unchanged)
+
+        updates = []
+        for result in unchanged:
+            if result["validated"] is None:
+                continue
+            row = rows_by_id[result["id"]]
+            warnings = result["parsed"]["warnings"]
+            if row["ocr_note"]:
+                warnings = [row["ocr_note"], *warnings]
+            updates.append(
+                {
+                    "b_id": result["id"],
+                    "b_status": row["status"],
+                    "extracted_fields": result["validated"],
+                    "field_confidence": result["parsed"]["confidence"],
+                    "warnings": warnings,
+                    # re-validation can rescue jobs that failed only on parsing/validation
+                    "status": "done",
+                    "error_message": None,
+                }
+            )
+        rescued: dict[str, dict] = {}
+        if updates:
+            stmt = update(jobs).where(jobs.c.id == bindparam("b_id"), jobs.c.status == bindparam("b_status"))
+            # Under AUTO_SAVE, failed jobs that now validate get a PORecord, so run their UPDATEs one
+            # by one to learn which ones the status guard let through; the rest go in one executemany.
+            saving = [u for u in updates if settings.auto_save and u["b_status"] == "failed"]
+            bulk = [u for u in updates if not (settings.auto_save and u["b_status"] == "failed")]
+            updated = db.execute(stmt, bulk).rowcount if bulk else 0
+            for u in saving:
+                if db.execute(stmt, u).rowcount:
+                    rescued[u["b_id"]] = u["extracted_fields"]
+            updated += len(rescued)
+            counts["written"] = updated
+            counts["skipped_busy"] += len(updates) - updated
+
+        # Like process_job, the parse checkpoint is kept even when validation fails.
+        checkpoint_ids = [r["id"] for r in unchanged]
+        if checkpoint_ids:
+            db.execute(
+                delete(JobCheckpoint).where(JobCheckpoint.job_id.in_(checkpoint_ids), JobCheckpoint.stage == "parse")
+            )
+            db.execute(
+                insert(JobCheckpoint),
+                [
+                    {
+                        "job_id": r["id"],
+                        "stage": "parse",
+                        "version": PARSER_VERSION,
+                        "input_digest": rows_by_id[r["id"]]["digest"],
+                        "data": r["parsed"],
+                    }
+                    for r in unchanged
+                ],
+            )
+
+        if rescued:
+            # process_job would have auto-saved these had they validated the first time.
+            saved = set(db.scalars(select(PORecord.job_id).where(PORecord.job_id.in_(rescued))))
+            records = [po_record_values(job_id, data) for job_id, data in rescued.items() if job_id not in saved]
+            if records:
+                db.execute(insert(PORecord), records)
+            counts["records_saved"] = len(records)
+        db.commit()
+    finally:
+        db.close()
+    return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk re-parse / re-validate stored OCR text")
+    parser.add_argument("--dry-run", action="store_true", help="report changed fields without writing")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--status", default="done,failed", help="comma-separated job statuses to include")
+    parser.add_argument("--force", action="store_true", help="re-parse even if the checkpoint is current")
+    parser.add_argument("--state-file", type=Path, default=settings.storage_dir / "reparse.state.json")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    parser.add_argument("--pause-sec", type=float, default=0.0, help="sleep between chunks to yield to the web app")
+    parser.add_argument("--show-diffs", type=int, default=20, help="max per-job diffs to print in dry-run")
+    args = parser.parse_args(argv)
+
+    init_db()
+    statuses = [s.strip() for s in args.status.split(",") if s.strip()]
+    state_key = f"{PARSER_VERSION}:{','.join(sorted(statuses))}"
+    last_id = ""
+    if not args.dry_run and not args.restart and args.state_file.exists():
+        state = json.loads(args.state_file.read_text(encoding="utf-8"))
+        if state.get("key") == state_key:
+            last_id = state.get("last_id", "")
+            print(f"resuming after job id {last_id}")
+
+    totals: Counter = Counter()
+    field_changes: Counter = Counter()
+    diffs_shown = 0
+    started = time.monotonic()
+    sub_batch = max(1, args.chunk_size // max(1, args.workers))
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        while True:
+            rows = load_chunk(last_id, statuses, args.chunk_size)
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            totals["scanned"] += len(rows)
+
+            todo = [
+                r
+                for r in rows
+                if args.force or r["parse_version"] != PARSER_VERSION or r["parse_digest"] != r["digest"]
+            ]
+            totals["skipped_current"] += len(rows) - len(todo)
+            batches = [
+                [(r["id"], r["raw_text"]) for r in todo[i : i + sub_batch]] for i in range(0, len(todo), sub_batch)
+            ]
+            results = [item for batch in pool.map(parse_batch, batches) for item in batch]
+            rows_by_id = {r["id"]: r for r in todo}
+
+            for result in results:
+                if result["validated"] is None:
+                    totals["invalid"] += 1
+                    continue
+                changes = changed_fields(rows_by_id[result["id"]]["extracted_fields"], result["validated"])
+                totals["changed" if changes else "unchanged"] += 1
+                field_changes.update(changes)
+                if args.dry_run and changes and diffs_shown < args.show_diffs:
+                    diffs_shown += 1
+                    old = rows_by_id[result["id"]]["extracted_fields"] or {}
+                    for name in changes:
+                        print(f"{result['id']} {name}: {old.get(name)!r} -> {result['validated'].get(name)!r}")
+
+            if not args.dry_run:
+                totals.update(write_chunk(results, rows_by_id))
+                args.state_file.parent.mkdir(parents=True, exist_ok=True)
+                args.state_file.write_text(json.dumps({"key": state_key, "last_id": last_id}), encoding="utf-8")
+
+            elapsed = time.monotonic() - started
+            print(f"... {totals['scanned']} jobs scanned, {totals['scanned'] / elapsed:.0f} jobs/s")
+            if args.pause_sec:
+                time.sleep(args.pause_sec)
+
+    elapsed = time.monotonic() - started
+    if not args.dry_run and args.state_file.exists():
+        args.state_file.unlink()  # finished; next run starts from the beginning
+
+    print(
+        f"{'dry-run: ' if args.dry_run else ''}scanned={totals['scanned']} changed={totals['changed']} "
+        f"unchanged={totals['unchanged']} invalid={totals['invalid']} skipped_current={totals['skipped_current']} "
+        f"written={totals['written']} skipped_busy={totals['skipped_busy']} records_saved={totals['records_saved']} "
+        f"in {elapsed:.1f}s ({totals['scanned'] / elapsed if elapsed else 0:.0f} jobs/s)"
+    )
+    for name, count in field_changes.most_common():
+        print(f"  {name}: {count} changed")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
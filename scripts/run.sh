@@ -23,6 +23,11 @@ case "$MODE" in
     # Dedicated OCR worker process that polls queued jobs from DB.
     python -m backend.app.worker
     ;;
+  model-server)
+    # Shared Typhoon model server: one model load, N inference replicas over IPC.
+    # Job workers use it when MODEL_SERVER_ADDRESS is set.
+    python -m backend.app.model_server
+    ;;
   prod)
     # Convenience mode: starts web + worker in the same shell for local testing.
     trap 'kill 0' EXIT
@@ -30,7 +35,7 @@ case "$MODE" in
     python -m backend.app.worker
     ;;
   *)
-    echo "Usage: $0 [dev|web|worker|prod]"
+    echo "Usage: $0 [dev|web|worker|model-server|prod]"
     exit 1
     ;;
 esac
@@ -0,0 +1,38 @@
+import os
+from pathlib import Path
+import tempfile
+
+import pytest
+
+# Point storage and the database at a throwaway directory before ``backend.app`` is imported.
+_storage = Path(tempfile.mkdtemp(prefix="po-tests-"))
+os.environ.update(
+    {
+        "STORAGE_DIR": str(_storage),
+        "UPLOADS_DIR": str(_storage / "uploads"),
+        "JOB_LOGS_DIR": str(_storage / "job_logs"),
+        "JOB_TRACES_DIR": str(_storage / "job_traces"),
+        "SQLITE_PATH": str(_storage / "app.db"),
+        "DATABASE_URL": "",
+        "OCR_MODE": "stub",
+    }
+)
+
+from backend.app.database import Base, SessionLocal, init_db  # noqa: E402
+
+
+def _clear(db):
+    for table in reversed(Base.metadata.sorted_tables):
+        db.execute(table.delete())
+    db.commit()
+
+
+@pytest.fixture
+def db_jobs():
+    """Sync session on an empty database (jobs, logs, checkpoints, PO records)."""
+    init_db()
+    db = SessionLocal()
+    _clear(db)
+    yield db
+    _clear(db)
+    db.close()
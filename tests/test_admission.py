@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+
+from backend.app.database import AsyncSessionLocal
+from backend.app.models import Job
+from backend.app.services.admission import DEFAULT_SERVICE_SEC, AdmissionController
+
+
+def _job(user_id: str, priority: str, status: str, at: datetime) -> Job:
+    job_id = str(uuid.uuid4())
+    return Job(
+        id=job_id,
+        user_id=user_id,
+        status=status,
+        priority=priority,
+        ocr_mode="stub",
+        file_path=f"/tmp/{job_id}.png",
+        original_filename="po.png",
+        created_at=at,
+        queued_at=at,
+        started_at=at if status != "queued" else None,
+    )
+
+
+def estimate(user_id: str, priority: str) -> float:
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await AdmissionController().estimate_wait_sec(db, user_id, priority)
+
+    return asyncio.run(run())
+
+
+def test_wait_counts_only_work_the_scheduler_starts_first(db_jobs):
+    now = datetime.utcnow()
+    db_jobs.add_all(_job("alice", "bulk", "queued", now - timedelta(seconds=10)) for _ in range(300))
+    db_jobs.commit()
+
+    service = DEFAULT_SERVICE_SEC["stub"]
+    # Interactive uploads start before anyone's bulk backlog.
+    assert estimate("bob", "interactive") == 0.0
+    assert estimate("alice", "interactive") == 0.0
+    # Alice's next bulk job queues behind her own 300.
+    assert estimate("alice", "bulk") == pytest.approx(300 * service)
+
+
+def test_running_jobs_count_remaining_service_time(db_jobs):
+    now = datetime.utcnow()
+    db_jobs.add(_job("alice", "interactive", "extracting", now - timedelta(hours=1)))
+    db_jobs.add(_job("alice", "interactive", "extracting", now))
+    db_jobs.commit()
+
+    # The hour-old job is overdue and contributes nothing; the fresh one its full service time at most.
+    assert 0.0 < estimate("bob", "interactive") <= DEFAULT_SERVICE_SEC["stub"]
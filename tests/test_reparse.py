@@ -0,0 +1,58 @@
+import random
+
+from sqlalchemy import event, select, update
+
+from backend.app.config import settings
+from backend.app.database import engine
+from backend.app.models import Job, PORecord
+from scripts import reparse_jobs
+from scripts.benchmark import generate_po
+
+
+def _failed_job(db, job_id: str) -> None:
+    text, _ = generate_po(random.Random(1), 1)
+    db.add(Job(id=job_id, user_id="u", status="failed", file_path="x", original_filename="x", raw_ocr_text=text))
+    db.commit()
+
+
+def _reparse(job_id: str):
+    rows = reparse_jobs.load_chunk("", ["failed"], 10)
+    results = reparse_jobs.parse_batch([(r["id"], r["raw_text"]) for r in rows])
+    assert [r["id"] for r in results if r["validated"]] == [job_id]
+    return reparse_jobs.write_chunk(results, {r["id"]: r for r in rows})
+
+
+def test_auto_save_rescues_failed_job(db_jobs, monkeypatch):
+    monkeypatch.setattr(settings, "auto_save", True)
+    _failed_job(db_jobs, "rescued")
+
+    counts = _reparse("rescued")
+
+    assert counts["written"] == 1 and counts["records_saved"] == 1
+    assert db_jobs.scalar(select(PORecord.job_id)) == "rescued"
+
+
+def test_job_requeued_before_update_gets_no_record(db_jobs, monkeypatch):
+    monkeypatch.setattr(settings, "auto_save", True)
+    _failed_job(db_jobs, "requeued")
+
+    raced = []
+
+    def requeue_first(conn, cursor, statement, parameters, context, executemany):
+        # /reprocess wins the race between write_chunk's status re-read and its UPDATE.
+        if statement.startswith("UPDATE jobs") and not raced:
+            raced.append(True)
+            with engine.begin() as other:
+                other.execute(update(Job).where(Job.id == "requeued").values(status="queued"))
+
+    event.listen(engine, "before_cursor_execute", requeue_first)
+    try:
+        counts = _reparse("requeued")
+    finally:
+        event.remove(engine, "before_cursor_execute", requeue_first)
+
+    assert counts["written"] == 0 and counts["skipped_busy"] == 1
+    assert counts["records_saved"] == 0
+    assert db_jobs.scalar(select(PORecord.job_id)) is None
+    db_jobs.expire_all()
+    assert db_jobs.get(Job, "requeued").status == "queued"
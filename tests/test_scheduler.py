@@ -0,0 +1,146 @@
+import asyncio
+from datetime import datetime, timedelta
+import uuid
+
+import pytest
+from sqlalchemy import update
+
+from backend.app.models import Job
+from backend.app.services.job_runner import JobRunner
+from backend.app.services.scheduler import FairQueue, FairSharePolicy, QueuedJob
+
+T0 = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def queued(user_id: str, n: int, priority: str = "interactive", offset_sec: float = 0.0) -> list[QueuedJob]:
+    return [
+        QueuedJob(f"{user_id}-{i}", user_id, priority, T0 + timedelta(seconds=offset_sec + i)) for i in range(n)
+    ]
+
+
+def run_single_worker(policy: FairSharePolicy, jobs: list[QueuedJob]) -> list[str]:
+    """Drain a FairQueue with one worker and return job ids in start order."""
+
+    async def drain():
+        queue = FairQueue(policy)
+        for job in jobs:
+            await queue.put(job)
+        started = []
+        while queue.qsize():
+            job = await queue.get()
+            started.append(job.job_id)
+            await queue.task_done(job)
+        return started
+
+    return asyncio.run(drain())
+
+
+def test_single_worker_does_not_drain_one_users_backlog_first():
+    # alice dumps a backlog, then bob uploads one interactive job
+    jobs = queued("alice", 5) + queued("bob", 1, offset_sec=60)
+    started = run_single_worker(FairSharePolicy(), jobs)
+    assert started.index("bob-0") == 1
+    assert started == ["alice-0", "bob-0", "alice-1", "alice-2", "alice-3", "alice-4"]
+
+
+def test_position_matches_single_worker_start_order():
+    policy = FairSharePolicy(user_weights={"carol": 2})
+    jobs = queued("alice", 5) + queued("bob", 2, offset_sec=30) + queued("carol", 4, offset_sec=60)
+    started = run_single_worker(policy, jobs)
+    positions = policy.positions(jobs, {}, T0 + timedelta(seconds=90))
+    assert sorted(positions, key=positions.get) == started
+
+
+def test_weights_share_starts_proportionally():
+    policy = FairSharePolicy(user_weights={"alice": 2})
+    started = run_single_worker(policy, queued("alice", 10) + queued("bob", 10))
+    first_six = [job_id.split("-")[0] for job_id in started[:6]]
+    assert first_six.count("alice") == 4
+    assert first_six.count("bob") == 2
+
+
+def test_recent_usage_is_remembered_between_picks():
+    policy = FairSharePolicy(usage_half_life_sec=600)
+    now = T0 + timedelta(minutes=1)
+    usage = policy.usage_from_starts([("alice", now - timedelta(seconds=10))] * 3, now)
+    pick = policy.pick(queued("alice", 1) + queued("bob", 1, offset_sec=30), {}, usage, now)
+    assert pick.user_id == "bob"
+
+
+def test_usage_decays_with_half_life():
+    policy = FairSharePolicy(usage_half_life_sec=600)
+    now = T0 + timedelta(hours=1)
+    usage = policy.usage_from_starts([("alice", now - timedelta(seconds=600))], now)
+    assert usage["alice"] == pytest.approx(0.5)
+
+
+def test_interactive_before_bulk_and_bulk_ages_up():
+    policy = FairSharePolicy(starvation_age_sec=300)
+    bulk = queued("alice", 1, priority="bulk")
+    interactive = queued("bob", 1, offset_sec=10)
+    assert policy.pick(bulk + interactive, {}, {}, T0 + timedelta(seconds=20)).user_id == "bob"
+    assert policy.pick(bulk + interactive, {}, {}, T0 + timedelta(seconds=400)).user_id == "alice"
+
+
+def test_per_user_cap_skips_capped_user():
+    policy = FairSharePolicy(max_running_per_user=1)
+    jobs = queued("alice", 3) + queued("bob", 1, offset_sec=30)
+    assert policy.pick(jobs, {"alice": 1}, {}, T0).user_id == "bob"
+    assert policy.pick(queued("alice", 3), {"alice": 1}, {}, T0) is None
+
+
+def test_db_claim_path_single_worker(db_jobs):
+    now = datetime.utcnow()
+    for i in range(5):
+        db_jobs.add(_job("alice", now - timedelta(seconds=120 - i)))
+    db_jobs.add(_job("bob", now - timedelta(seconds=60)))
+    db_jobs.commit()
+
+    runner = JobRunner()
+
+    async def drain():
+        order = []
+        while job_id := await runner._claim_next_queued_job():
+            order.append(job_id)
+            # a single worker finishes each job before claiming the next
+            db_jobs.execute(update(Job).where(Job.id == job_id).values(status="done"))
+            db_jobs.commit()
+        return order
+
+    order = asyncio.run(drain())
+    users = [db_jobs.get(Job, job_id).user_id for job_id in order]
+    assert users == ["alice", "bob", "alice", "alice", "alice", "alice"]
+
+
+def test_requeued_job_ages_from_requeue_not_upload(db_jobs):
+    now = datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    orphan = _job("alice", week_ago, priority="bulk", status="extracting")
+    orphan.updated_at = week_ago
+    fresh = _job("bob", now - timedelta(seconds=1))
+    db_jobs.add_all([orphan, fresh])
+    db_jobs.commit()
+
+    runner = JobRunner()
+
+    async def requeue_then_claim():
+        assert await runner.requeue_stale_jobs() == [orphan.id]
+        return await runner._claim_next_queued_job()
+
+    assert asyncio.run(requeue_then_claim()) == fresh.id
+    db_jobs.expire_all()
+    assert db_jobs.get(Job, orphan.id).queued_at > now
+
+
+def _job(user_id: str, created_at: datetime, priority: str = "interactive", status: str = "queued") -> Job:
+    job_id = str(uuid.uuid4())
+    return Job(
+        id=job_id,
+        user_id=user_id,
+        status=status,
+        priority=priority,
+        file_path=f"/tmp/{job_id}.png",
+        original_filename="po.png",
+        created_at=created_at,
+        queued_at=created_at,
+    )
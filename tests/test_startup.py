@@ -0,0 +1,8 @@
+from scripts.check_startup import check
+
+
+def test_web_startup_stays_light():
+    # The absolute import time depends on the machine; ``python -m scripts.check_startup`` enforces it.
+    best, failures = check(budget_ms=None)
+    assert failures == [], failures
+    assert not best["touched_fs"]